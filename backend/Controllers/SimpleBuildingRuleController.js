@@ -10,7 +10,7 @@ exports.createRule = async (req, res) => {
       return res.status(400).json({ errors: errors.array() });
     }
 
-    const { cityName, pincode, rules, validFrom, validUntil, status } = req.body;
+    const { cityName, pincode, rules, adjacencyRules, validFrom, validUntil, status } = req.body;
 
     // Check if a rule for this city and pincode already exists
     const existingRule = await SimpleBuildingRule.findOne({ cityName, pincode });
@@ -43,6 +43,7 @@ exports.createRule = async (req, res) => {
       cityName,
       pincode,
       rules: processedRules,
+      adjacencyRules: Array.isArray(adjacencyRules) ? adjacencyRules : [],
       validFrom: parsedValidFrom,
       validUntil: parsedValidUntil,
       status: status || 'draft',
@@ -140,7 +141,7 @@ exports.getRulesByPincode = async (req, res) => {
 exports.updateRule = async (req, res) => {
   try {
     const { id } = req.params;
-    const { cityName, pincode, rules, validFrom, validUntil, status } = req.body;
+    const { cityName, pincode, rules, adjacencyRules, validFrom, validUntil, status } = req.body;
 
     // Check if rule exists
     const existingRule = await SimpleBuildingRule.findById(id);
@@ -170,6 +171,11 @@ exports.updateRule = async (req, res) => {
       updates.rules = processedRules;
     }
 
+    // Adjacency rules are replaced as a whole; an empty list removes them
+    if (Array.isArray(adjacencyRules)) {
+      updates.adjacencyRules = adjacencyRules;
+    }
+
     // Process dates if provided
     if (validFrom) {
       const parsedValidFrom = new Date(validFrom);
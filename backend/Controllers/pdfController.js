@@ -1,34 +1,21 @@
-const { spawn } = require("child_process");
-const path = require("path");
+const { extractionWorker } = require("../utils/extractionWorker");
 
-exports.processPDF = (req, res) => {
+exports.processPDF = async (req, res) => {
   const filePath = req.file.path;
 
-  const pythonProcess = spawn("python", [
-    path.join(__dirname, "../python/extract_rooms.py"),
-    filePath,
-  ]);
-
-  let data = "";
-  pythonProcess.stdout.on("data", (chunk) => {
-    data += chunk;
-  });
-
-  pythonProcess.stderr.on("data", (chunk) => {
-    console.error(`Error: ${chunk}`);
-  });
-
-  pythonProcess.on("close", (code) => {
-    if (code === 0) {
-      res.status(200).json({
-        status: "success",
-        message: "PDF processed successfully",
-        data: JSON.parse(data),
-      });
-    } else {
-      res
-        .status(500)
-        .json({ status: "error", message: "Failed to process PDF" });
-    }
-  });
+  try {
+    // One PyMuPDF pass gives labels and coloured regions together; parsed by
+    // the warm extract_rooms.py worker pool instead of a new process per upload
+    const data = await extractionWorker.extractPlan(filePath);
+    res.status(200).json({
+      status: "success",
+      message: "PDF processed successfully",
+      data,
+    });
+  } catch (error) {
+    console.error(`Error: ${error.message}`);
+    res
+      .status(500)
+      .json({ status: "error", message: "Failed to process PDF" });
+  }
 };
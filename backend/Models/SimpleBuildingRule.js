@@ -66,6 +66,31 @@ const SimpleBuildingRuleSchema = new Schema({
       }
     }
   ],
+  // Rules about which rooms may or must share a wall, checked against the
+  // room adjacency graph of a plan
+  adjacencyRules: [
+    {
+      sequence: {
+        type: Number
+      },
+      roomType: {
+        type: String,
+        required: true
+      },
+      relation: {
+        type: String,
+        required: true,
+        enum: ['must_adjoin', 'must_not_adjoin', 'must_touch_exterior']
+      },
+      // Other room type for must_adjoin / must_not_adjoin
+      targetType: {
+        type: String
+      },
+      description: {
+        type: String
+      }
+    }
+  ],
   validFrom: {
     type: Date,
     default: Date.now
@@ -1,6 +1,84 @@
+import glob
+import os
+import sys
+import time
+
 import pdfplumber
+from shapely import STRtree
 from shapely.geometry import Polygon
 
+ROOM_KEYWORDS = ["bedroom", "kitchen", "toilet", "hall"]
+
+def extract_text_boxes(page):
+    """Room labels of a pdfplumber page with their bounding boxes"""
+    text_boxes = []
+    for word in page.extract_words():
+        text = word["text"].lower()
+        if any(keyword in text for keyword in ROOM_KEYWORDS):
+            text_boxes.append({
+                "label": text,
+                "bbox": (word["x0"], word["top"], word["x1"], word["bottom"])
+            })
+    return text_boxes
+
+def extract_shapes(page):
+    """Lines and rectangles of a pdfplumber page as polygons"""
+    shapes = []
+    for line in page.lines + page.rects:
+        if "x0" in line and "x1" in line and "top" in line and "bottom" in line:
+            shapes.append(Polygon([
+                (line["x0"], line["top"]),
+                (line["x1"], line["top"]),
+                (line["x1"], line["bottom"]),
+                (line["x0"], line["bottom"])
+            ]))
+    return shapes
+
+def room_boundary(text_box, shape, scale_factor):
+    # Calculate area in real-world units
+    pdf_area = shape.area
+    real_world_area = pdf_area * (scale_factor ** 2)
+
+    return {
+        "label": text_box["label"],
+        "bounding_box": list(shape.exterior.coords),
+        "real_world_area (sq feet)": round(real_world_area, 2)
+    }
+
+def label_centroid(text_box):
+    x0, y0, x1, y1 = text_box["bbox"]
+    return Polygon([(x0, y0), (x1, y0), (x1, y1), (x0, y1)]).centroid
+
+def match_labels_to_shapes(text_boxes, shapes, scale_factor):
+    """
+    Match each label with every shape containing the centre of its box.
+    The shapes are bulk-loaded into an STRtree once per page, so each label
+    is only tested against the shapes whose bounding box holds its centre.
+    Matches come out in the same order as a scan over all shapes.
+    """
+    if not text_boxes or not shapes:
+        return []
+    tree = STRtree(shapes)
+    matches = []
+    for text_box in text_boxes:
+        centroid = label_centroid(text_box)
+        # query() returns candidate indices in tree order; sort to keep drawing order
+        for index in sorted(tree.query(centroid)):
+            shape = shapes[index]
+            if shape.contains(centroid):
+                matches.append(room_boundary(text_box, shape, scale_factor))
+    return matches
+
+def match_labels_to_shapes_linear(text_boxes, shapes, scale_factor):
+    """Label matching by testing every label against every shape (kept for benchmarking)"""
+    matches = []
+    for text_box in text_boxes:
+        centroid = label_centroid(text_box)
+        for shape in shapes:
+            if shape.contains(centroid):
+                matches.append(room_boundary(text_box, shape, scale_factor))
+    return matches
+
 def extract_boundaries_and_labels(pdf_path, scale_factor):
     """
     Extract room boundaries and labels from the PDF.
@@ -19,50 +97,60 @@ def extract_boundaries_and_labels(pdf_path, scale_factor):
             print(f"Processing page {page_number}...")
             
             # Extract room labels and their bounding boxes
-            text_boxes = []
-            for word in page.extract_words():
-                text = word["text"].lower()
-                if any(keyword in text for keyword in ["bedroom", "kitchen", "toilet", "hall"]):
-                    text_boxes.append({
-                        "label": text,
-                        "bbox": (word["x0"], word["top"], word["x1"], word["bottom"])
-                    })
+            text_boxes = extract_text_boxes(page)
 
             # Extract vector shapes (lines and rectangles)
-            shapes = []
-            for line in page.lines + page.rects:
-                if "x0" in line and "x1" in line and "top" in line and "bottom" in line:
-                    shapes.append(Polygon([
-                        (line["x0"], line["top"]),
-                        (line["x1"], line["top"]),
-                        (line["x1"], line["bottom"]),
-                        (line["x0"], line["bottom"])
-                    ]))
-
-            # Match text boxes with nearby shapes
-            for text_box in text_boxes:
-                x0, y0, x1, y1 = text_box["bbox"]
-                text_polygon = Polygon([(x0, y0), (x1, y0), (x1, y1), (x0, y1)])
-                for shape in shapes:
-                    if shape.contains(text_polygon.centroid):
-                        # Calculate area in real-world units
-                        pdf_area = shape.area
-                        real_world_area = pdf_area * (scale_factor ** 2)
-
-                        room_boundaries.append({
-                            "label": text_box["label"],
-                            "bounding_box": list(shape.exterior.coords),
-                            "real_world_area (sq feet)": round(real_world_area, 2)
-                        })
+            shapes = extract_shapes(page)
+
+            # Match text boxes with the shapes containing them
+            room_boundaries.extend(match_labels_to_shapes(text_boxes, shapes, scale_factor))
 
     return room_boundaries
 
-def main():
-    # Path to the PDF file
-    pdf_path = "/mnt/data/hbninfotech_2BHK_HOUSE_PLAN.pdf"  # Replace with your file path
+def benchmark(pdf_paths, scale_factor, repeat=5):
+    """
+    Time the indexed and the linear label matching on the pages of the given
+    PDFs, checking that both give identical results.
+    """
+    print(f"{'file':45} {'labels':>6} {'shapes':>7} {'linear ms':>10} {'indexed ms':>10} {'speedup':>8}")
+    for pdf_path in pdf_paths:
+        with pdfplumber.open(pdf_path) as pdf:
+            pages = [(extract_text_boxes(page), extract_shapes(page)) for page in pdf.pages]
+
+        timings = {}
+        results = {}
+        for name, matcher in (("linear", match_labels_to_shapes_linear), ("indexed", match_labels_to_shapes)):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results[name] = [matcher(text_boxes, shapes, scale_factor) for text_boxes, shapes in pages]
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+
+        if results["linear"] != results["indexed"]:
+            raise AssertionError(f"Indexed matching differs from the linear scan for {pdf_path}")
+        labels = sum(len(text_boxes) for text_boxes, _ in pages)
+        shapes = sum(len(page_shapes) for _, page_shapes in pages)
+        speedup = timings["linear"] / timings["indexed"] if timings["indexed"] else float("inf")
+        print(f"{os.path.basename(pdf_path)[:45]:45} {labels:6} {shapes:7} "
+              f"{timings['linear'] * 1000:10.2f} {timings['indexed'] * 1000:10.2f} {speedup:7.1f}x")
 
+def main():
     # Define the scaling factor (e.g., 1 cm = 1 foot)
     cm_to_feet_conversion = 1 / 2.54 * 12  # 1 inch = 2.54 cm, 12 inches = 1 foot
+
+    # python coordinates.py --benchmark [plan.pdf ...] compares the label matchers
+    if sys.argv[1:2] == ["--benchmark"]:
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        pdf_paths = sys.argv[2:] or sorted(
+            glob.glob(os.path.join(repo_root, "MAP", "*.pdf")) + glob.glob(os.path.join(repo_root, "backend", "files", "*.pdf"))
+        )
+        benchmark(pdf_paths, cm_to_feet_conversion)
+        return
+
+    # Path to the PDF file
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else "/mnt/data/hbninfotech_2BHK_HOUSE_PLAN.pdf"  # Replace with your file path
+
     scale_factor = cm_to_feet_conversion
 
     # Extract room boundaries and labels
@@ -1,9 +1,71 @@
 import sys
+import argparse
 import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pdfminer.high_level import extract_pages
 from pdfminer.layout import LTTextContainer
 
-def extract_room_dimensions(pdf_path):
+# The combined room model comes from the PyMuPDF engine of the Quart backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backendQuart'))
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+EXTRACTION_ERROR = -32000
+
+# Room type -> label spellings. Covers the keywords of the pdfminer
+# extractor; matching is case-insensitive and spaces match any whitespace.
+DEFAULT_SYNONYMS = {
+    "bedroom": ["master bed", "bed room", "bedroom"],
+    "kitchen": ["open kitchen", "kitchen"],
+    "bathroom": ["bathroom", "toilet"],
+    "hall": ["living room", "hall"],
+    "dining": ["dining"],
+    "store": ["store"],
+    "room": ["room"]
+}
+
+class KeywordMatcher:
+    """
+    One compiled, case-insensitive regular expression over all synonyms.
+    Longer spellings are tried first so "bed room" wins over "room".
+    """
+
+    def __init__(self, synonyms=None):
+        synonyms = synonyms or DEFAULT_SYNONYMS
+        self.room_types = {}
+        for room_type, spellings in synonyms.items():
+            for spelling in spellings:
+                self.room_types[self.normalize(spelling)] = room_type
+        alternatives = sorted(self.room_types, key=len, reverse=True)
+        self.pattern = re.compile(
+            "|".join(r"\s+".join(map(re.escape, spelling.split())) for spelling in alternatives),
+            re.IGNORECASE
+        )
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(text.lower().split())
+
+    def room_type(self, text):
+        """Room type of the first keyword in text, or None"""
+        match = self.pattern.search(text)
+        return self.room_types[self.normalize(match.group(0))] if match else None
+
+default_matcher = KeywordMatcher()
+
+def load_synonyms(path):
+    """Synonyms from a JSON file of {room type: [spellings]}"""
+    with open(path) as f:
+        return json.load(f)
+
+def extract_room_dimensions_pdfminer(pdf_path):
     room_data = []
     keywords = ['Room', 'OPEN KITCHEN', 'TOILET', 'BED ROOM', 'Living Room',
                 'HALL', 'Bathroom', 'Dining', 'Store', 'Toilet', 'Kitchen']
@@ -20,7 +82,226 @@ def extract_room_dimensions(pdf_path):
                     })
     return room_data
 
+def extract_room_dimensions(pdf_path, matcher=None):
+    """
+    Room labels of a PDF from PyMuPDF's span-level text. Each label starts at
+    a line holding a room keyword and takes the lines below it in the same
+    text block (usually the room dimensions), like a pdfminer text container.
+    Coordinates use the same bottom-left origin as
+    extract_room_dimensions_pdfminer; each entry also carries the matched
+    room_type.
+    """
+    import fitz  # PyMuPDF, imported late so its notices do not reach stdout
+    matcher = matcher or default_matcher
+    room_data = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            page_height = page.rect.height
+            for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+                groups = []
+                for line in block.get("lines", []):
+                    text = "".join(span["text"] for span in line["spans"]).strip()
+                    if not text:
+                        continue
+                    room_type = matcher.room_type(text)
+                    if room_type:
+                        groups.append((room_type, [text], [line["bbox"]]))
+                    elif groups:
+                        groups[-1][1].append(text)
+                        groups[-1][2].append(line["bbox"])
+                for room_type, lines, boxes in groups:
+                    x0 = min(box[0] for box in boxes)
+                    top = min(box[1] for box in boxes)
+                    x1 = max(box[2] for box in boxes)
+                    bottom = max(box[3] for box in boxes)
+                    room_data.append({
+                        'label': "\n".join(lines),
+                        'room_type': room_type,
+                        'coordinates': {'x0': x0, 'y0': page_height - bottom, 'x1': x1, 'y1': page_height - top}
+                    })
+    return room_data
+
+def extract_rooms(pdf_path, synonyms=None, engine="pymupdf"):
+    if engine == "pdfminer":
+        return extract_room_dimensions_pdfminer(pdf_path)
+    return extract_room_dimensions(pdf_path, KeywordMatcher(synonyms) if synonyms else None)
+
+def extract_file(pdf_path, synonyms=None, engine="pymupdf"):
+    """One JSON line record of the batch mode"""
+    try:
+        return {"file": pdf_path, "rooms": extract_rooms(pdf_path, synonyms, engine)}
+    except Exception as e:
+        return {"file": pdf_path, "error": str(e)}
+
+def extract_directory(directory, output, workers=None, synonyms=None, engine="pymupdf"):
+    """
+    Extract every PDF of a directory across worker processes, writing one
+    JSON line per file to output as soon as it is done.
+    """
+    pdf_paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith('.pdf')
+    )
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(extract_file, pdf_path, synonyms, engine) for pdf_path in pdf_paths]
+        for future in as_completed(futures):
+            output.write(json.dumps(future.result()) + "\n")
+            output.flush()
+    return len(pdf_paths)
+
+def exit_with_parent(parent_pid):
+    """Worker initializer: exit once the server process is gone, even if it was killed"""
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(1)
+    threading.Thread(target=watch, daemon=True).start()
+
+def extract_plan(pdf_path):
+    """Regions, labels and rooms of a PDF in one PyMuPDF pass (see backendQuart/plan_extractor.py)"""
+    from plan_extractor import extract_plan as extract_plan_model
+    return extract_plan_model(pdf_path)
+
+# JSON-RPC methods run in the worker processes
+METHODS = {
+    "extract_rooms": extract_room_dimensions,
+    "extract_plan": extract_plan
+}
+
+class ExtractionServer:
+    """
+    Long-running extraction server for the Node backend. Requests arrive on
+    stdin as newline-delimited JSON-RPC 2.0, e.g.
+
+        {"jsonrpc": "2.0", "id": 1, "method": "extract_rooms", "params": {"path": "plan.pdf"}}
+
+    (or "extract_plan" for the combined room model of plan_extractor) and
+    are handed to a pool of warm worker processes, so up to `workers`
+    PDFs are parsed at once. Each response is written to stdout as one line
+    as soon as it is ready, so responses can come back out of order and are
+    matched by id. `health` answers straight from the server process.
+    Closing stdin (or the `shutdown` method) stops the server once pending
+    requests are answered.
+    """
+
+    def __init__(self, workers=None, output=sys.stdout):
+        self.workers = workers or os.cpu_count() or 1
+        self.output = output
+        self.write_lock = threading.Lock()
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=exit_with_parent, initargs=(os.getpid(),)
+        )
+        self.started = time.time()
+        self.pending = 0
+        self.stats = {"handled": 0, "failed": 0}
+
+    def send(self, message):
+        line = json.dumps(message)
+        with self.write_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def respond(self, request_id, result=None, error=None):
+        if request_id is None:
+            return  # notifications get no response
+        message = {"jsonrpc": "2.0", "id": request_id}
+        if error is not None:
+            message["error"] = error
+        else:
+            message["result"] = result
+        self.send(message)
+
+    def health(self):
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "workers": self.workers,
+            "pending": self.pending,
+            "uptime": round(time.time() - self.started, 3),
+            **self.stats
+        }
+
+    def finish(self, request_id, future):
+        error = future.exception()
+        with self.write_lock:
+            self.pending -= 1
+            self.stats["failed" if error else "handled"] += 1
+        if error:
+            self.respond(request_id, error={"code": EXTRACTION_ERROR, "message": str(error)})
+        else:
+            self.respond(request_id, future.result())
+
+    def handle(self, line):
+        """Handle one request line; returns False once the server should stop reading"""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            self.send({"jsonrpc": "2.0", "id": None, "error": {"code": PARSE_ERROR, "message": f"Parse error: {str(e)}"}})
+            return True
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            request_id = request.get("id") if isinstance(request, dict) else None
+            self.send({"jsonrpc": "2.0", "id": request_id, "error": {"code": INVALID_REQUEST, "message": "Invalid request"}})
+            return True
+
+        request_id = request.get("id")
+        method = request["method"]
+        params = request.get("params") or {}
+
+        if method == "health":
+            self.respond(request_id, self.health())
+        elif method == "shutdown":
+            self.respond(request_id, {"status": "stopping"})
+            return False
+        elif method in METHODS:
+            pdf_path = params.get("path") if isinstance(params, dict) else None
+            if not pdf_path:
+                self.respond(request_id, error={"code": INVALID_PARAMS, "message": "params.path is required"})
+                return True
+            with self.write_lock:
+                self.pending += 1
+            future = self.executor.submit(METHODS[method], pdf_path)
+            future.add_done_callback(lambda f: self.finish(request_id, f))
+        else:
+            self.respond(request_id, error={"code": METHOD_NOT_FOUND, "message": f"Unknown method {method}"})
+        return True
+
+    def serve(self, input=sys.stdin):
+        # Start the workers (and their pdfminer imports) before the first upload
+        list(self.executor.map(len, [""] * self.workers))
+        self.send({"jsonrpc": "2.0", "method": "ready", "params": self.health()})
+        try:
+            for line in input:
+                if line.strip() and not self.handle(line):
+                    break
+        finally:
+            # Answer everything already submitted before exiting
+            self.executor.shutdown(wait=True)
+
 if __name__ == '__main__':
-    pdf_path = sys.argv[1]
-    data = extract_room_dimensions(pdf_path)
-    print(json.dumps(data))
+    parser = argparse.ArgumentParser(description="Extract room labels from floor plan PDFs")
+    parser.add_argument("pdf", nargs="?", help="PDF to extract")
+    parser.add_argument("--serve", action="store_true", help="run the JSON-RPC worker server on stdin/stdout")
+    parser.add_argument("--plan", action="store_true", help="print the combined room model instead of labels")
+    parser.add_argument("--batch", metavar="DIR", help="extract every PDF in DIR, one JSON line per file")
+    parser.add_argument("--workers", type=int, help="worker processes for --serve and --batch")
+    parser.add_argument("--synonyms", help="JSON file of {room type: [label spellings]}")
+    parser.add_argument("--engine", choices=["pymupdf", "pdfminer"], default="pymupdf")
+    # Backwards compatible: extract_rooms.py --serve 4
+    args = parser.parse_args()
+    if args.serve and args.pdf and args.pdf.isdigit():
+        args.workers = int(args.pdf)
+
+    # Keep anything libraries print (e.g. PyMuPDF's deprecation notice)
+    # off stdout, which carries the JSON output
+    output, sys.stdout = sys.stdout, sys.stderr
+    synonyms = load_synonyms(args.synonyms) if args.synonyms else None
+
+    if args.serve:
+        ExtractionServer(args.workers, output).serve()
+    elif args.batch:
+        extract_directory(args.batch, output, args.workers, synonyms, args.engine)
+    elif args.pdf and args.plan:
+        output.write(json.dumps(extract_plan(args.pdf)) + "\n")
+    elif args.pdf:
+        output.write(json.dumps(extract_rooms(args.pdf, synonyms, args.engine)) + "\n")
+    else:
+        parser.error("a PDF, --batch DIR or --serve is required")
@@ -0,0 +1,173 @@
+const { spawn } = require("child_process");
+const path = require("path");
+const readline = require("readline");
+
+const SCRIPT_PATH = path.join(__dirname, "../python_scripts/extract_rooms.py");
+
+/**
+ * Client for the long-running `extract_rooms.py --serve` process.
+ *
+ * The Python server keeps a pool of warm worker processes and speaks
+ * newline-delimited JSON-RPC over stdin/stdout, so uploads no longer pay
+ * interpreter startup and pdfminer import. Requests carry an id and may be
+ * answered out of order. The server is started on first use, restarted if
+ * it exits, and health-checked periodically; a server that stops answering
+ * health checks is killed and replaced.
+ */
+class ExtractionWorker {
+  constructor({
+    pythonPath = process.env.PYTHON_PATH || "python",
+    workers = parseInt(process.env.EXTRACTION_WORKERS || "0", 10) || undefined,
+    timeoutMs = parseInt(process.env.EXTRACTION_TIMEOUT_MS || "120000", 10),
+    healthIntervalMs = parseInt(process.env.EXTRACTION_HEALTH_INTERVAL_MS || "30000", 10),
+  } = {}) {
+    this.pythonPath = pythonPath;
+    this.workers = workers;
+    this.timeoutMs = timeoutMs;
+    this.healthIntervalMs = healthIntervalMs;
+    this.child = null;
+    this.ready = null;
+    this.nextId = 1;
+    this.pending = new Map();
+    this.healthTimer = null;
+  }
+
+  start() {
+    if (this.child) {
+      return this.ready;
+    }
+
+    const args = [SCRIPT_PATH, "--serve"];
+    if (this.workers) {
+      args.push(String(this.workers));
+    }
+    const child = spawn(this.pythonPath, args, { stdio: ["pipe", "pipe", "pipe"] });
+    this.child = child;
+
+    this.ready = new Promise((resolve, reject) => {
+      this.onReady = resolve;
+      this.onStartFailed = reject;
+      child.once("error", reject);
+    });
+    // Avoid unhandled rejections when nobody is waiting on startup
+    this.ready.catch(() => {});
+
+    readline.createInterface({ input: child.stdout }).on("line", (line) => this.handleLine(line));
+    child.stderr.on("data", (chunk) => {
+      console.error(`Extraction worker: ${chunk}`);
+    });
+    child.on("exit", (code, signal) => {
+      console.error(`Extraction worker exited (code ${code}, signal ${signal})`);
+      child.stdin.destroy();
+      child.stdout.destroy();
+      child.stderr.destroy();
+      this.onStartFailed(new Error("Extraction worker exited before it was ready"));
+      if (this.child === child) {
+        this.child = null;
+        this.failPending(new Error("Extraction worker exited"));
+      }
+    });
+
+    if (!this.healthTimer && this.healthIntervalMs > 0) {
+      this.healthTimer = setInterval(() => this.checkHealth(), this.healthIntervalMs);
+      this.healthTimer.unref();
+    }
+    return this.ready;
+  }
+
+  handleLine(line) {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (error) {
+      console.error(`Extraction worker sent invalid JSON: ${line}`);
+      return;
+    }
+
+    if (message.method === "ready") {
+      this.onReady(message.params);
+      return;
+    }
+
+    const request = this.pending.get(message.id);
+    if (!request) {
+      return;
+    }
+    this.pending.delete(message.id);
+    clearTimeout(request.timer);
+    if (message.error) {
+      request.reject(new Error(message.error.message));
+    } else {
+      request.resolve(message.result);
+    }
+  }
+
+  failPending(error) {
+    for (const request of this.pending.values()) {
+      clearTimeout(request.timer);
+      request.reject(error);
+    }
+    this.pending.clear();
+  }
+
+  async call(method, params = {}, timeoutMs = this.timeoutMs) {
+    await this.start();
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`Extraction worker timed out after ${timeoutMs} ms`));
+      }, timeoutMs);
+      this.pending.set(id, { resolve, reject, timer });
+      this.child.stdin.write(JSON.stringify({ jsonrpc: "2.0", id, method, params }) + "\n");
+    });
+  }
+
+  extractRooms(pdfPath) {
+    return this.call("extract_rooms", { path: pdfPath });
+  }
+
+  extractPlan(pdfPath) {
+    return this.call("extract_plan", { path: pdfPath });
+  }
+
+  health() {
+    return this.call("health", {}, 5000);
+  }
+
+  async checkHealth() {
+    if (!this.child) {
+      return;
+    }
+    try {
+      await this.health();
+    } catch (error) {
+      console.error(`Extraction worker failed its health check, restarting: ${error.message}`);
+      this.restart();
+    }
+  }
+
+  restart() {
+    const child = this.child;
+    this.child = null;
+    this.failPending(new Error("Extraction worker restarted"));
+    if (child) {
+      child.kill();
+    }
+    return this.start();
+  }
+
+  stop() {
+    clearInterval(this.healthTimer);
+    this.healthTimer = null;
+    if (this.child) {
+      // Closing stdin lets the server answer pending requests and exit
+      this.child.stdin.end();
+      this.child = null;
+    }
+  }
+}
+
+const extractionWorker = new ExtractionWorker();
+
+module.exports = { ExtractionWorker, extractionWorker };
@@ -0,0 +1,194 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Relations an adjacency rule can require between a room type and another
+# room type (or the outside of the plan)
+MUST_ADJOIN = "must_adjoin"
+MUST_NOT_ADJOIN = "must_not_adjoin"
+MUST_TOUCH_EXTERIOR = "must_touch_exterior"
+RELATIONS = (MUST_ADJOIN, MUST_NOT_ADJOIN, MUST_TOUCH_EXTERIOR)
+
+# Rooms whose facing edges are this many points apart share a wall (the
+# wall's drawn thickness), and must overlap this much along it so rooms
+# meeting at a corner are not neighbours
+DEFAULT_TOLERANCE = 6.0
+DEFAULT_MIN_CONTACT = 12.0
+# Longest side of the occupancy grid used to find exterior walls
+GRID_RESOLUTION = 1024
+
+
+def compile_adjacency_rules(adjacency_rules):
+    """
+    Normalize the `adjacencyRules` of a building rules document, in sequence
+    order: [{"roomType", "relation", "targetType", "description"}, ...].
+    Rules with an unknown relation or a missing room type are skipped.
+    """
+    compiled = []
+    for rule in sorted(adjacency_rules or [], key=lambda rule: rule.get('sequence') or 0):
+        relation = rule.get('relation')
+        room_type = (rule.get('roomType') or '').lower()
+        target_type = (rule.get('targetType') or '').lower()
+        if relation not in RELATIONS or not room_type or (relation != MUST_TOUCH_EXTERIOR and not target_type):
+            logger.warning(f"Skipping invalid adjacency rule: {rule}")
+            continue
+        if rule.get('description'):
+            message = rule['description']
+        elif relation == MUST_TOUCH_EXTERIOR:
+            message = f"{rule['roomType']} must touch an exterior wall"
+        elif relation == MUST_ADJOIN:
+            message = f"{rule['roomType']} must adjoin a {rule['targetType']}"
+        else:
+            message = f"{rule['roomType']} must not adjoin a {rule['targetType']}"
+        compiled.append({
+            "room_type": room_type,
+            "relation": relation,
+            "target_type": target_type,
+            "message": message
+        })
+    return compiled
+
+
+def adjacency_edges(bboxes, tolerance=DEFAULT_TOLERANCE, min_contact=DEFAULT_MIN_CONTACT):
+    """
+    Pairs (i, j), i < j, of rectangles (x0, y0, x1, y1) that share a wall:
+    facing edges at most `tolerance` apart and overlapping by at least
+    `min_contact` along them. Sort and sweep along x: with the boxes sorted
+    by x0, each box is only compared with the boxes starting before its own
+    x1 + tolerance, found by binary search, instead of with every other box.
+    Returns an (edges x 2) array.
+    """
+    boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    order = np.argsort(boxes[:, 0], kind="stable")
+    ordered = boxes[order]
+    # Candidates of sorted box i are the sorted boxes i + 1 .. ends[i] - 1
+    ends = np.searchsorted(ordered[:, 0], ordered[:, 2] + tolerance, side="right")
+    counts = np.maximum(ends - np.arange(len(ordered)) - 1, 0)
+    first = np.repeat(np.arange(len(ordered)), counts)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    second = first + 1 + np.arange(len(first)) - starts
+
+    a, b = ordered[first], ordered[second]
+    # Positive when the boxes are apart along an axis, minus the overlap otherwise
+    gap_x = np.maximum(b[:, 0] - a[:, 2], a[:, 0] - b[:, 2])
+    gap_y = np.maximum(b[:, 1] - a[:, 3], a[:, 1] - b[:, 3])
+    touching = (
+        ((np.abs(gap_x) <= tolerance) & (-gap_y >= min_contact))
+        | ((np.abs(gap_y) <= tolerance) & (-gap_x >= min_contact))
+    )
+    edges = np.column_stack((order[first[touching]], order[second[touching]]))
+    edges.sort(axis=1)
+    return edges
+
+
+def summed_area(mask):
+    """Summed-area table of a boolean grid, padded so table[y, x] counts mask[:y, :x]"""
+    table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = mask.cumsum(axis=0).cumsum(axis=1)
+    return table
+
+
+def exterior_rooms(bboxes, tolerance=DEFAULT_TOLERANCE, resolution=GRID_RESOLUTION):
+    """
+    Boolean array, True for rectangles lying on the outside of the plan.
+    Rooms, grown by `tolerance` so wall gaps between them close, are painted
+    on a coarse occupancy grid. Free cells that can see the edge of the grid
+    along their row or column are outside, and a room is exterior when such
+    a cell lies right next to it. Every step is a whole-grid array
+    operation; each room costs a constant number of lookups in summed-area
+    tables.
+    """
+    boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    if not len(boxes):
+        return np.zeros(0, dtype=bool)
+    extent = (boxes[:, 2:].max(axis=0) - boxes[:, :2].min(axis=0)).max()
+    cell = max(tolerance / 2, extent / resolution, 1e-6)
+    origin = boxes[:, :2].min(axis=0) - tolerance - 2 * cell
+    size = np.ceil((boxes[:, 2:].max(axis=0) + tolerance + 2 * cell - origin) / cell).astype(int) + 1
+
+    def cells(grow, margin):
+        low = np.floor((boxes[:, :2] - grow - origin) / cell).astype(int) - margin
+        high = np.ceil((boxes[:, 2:] + grow - origin) / cell).astype(int) + margin
+        return np.clip(low, 0, size), np.clip(high, 0, size)
+
+    # Paint all rooms at once: +1/-1 at the corners, then a 2D prefix sum
+    low, high = cells(tolerance, 0)
+    corners = np.zeros((size[1] + 1, size[0] + 1), dtype=np.int32)
+    np.add.at(corners, (low[:, 1], low[:, 0]), 1)
+    np.add.at(corners, (low[:, 1], high[:, 0]), -1)
+    np.add.at(corners, (high[:, 1], low[:, 0]), -1)
+    np.add.at(corners, (high[:, 1], high[:, 0]), 1)
+    occupied = corners.cumsum(axis=0).cumsum(axis=1)[:-1, :-1] > 0
+
+    # Occupied cells at or before / after each cell along rows and columns
+    blocked = (
+        np.logical_or.accumulate(occupied, axis=1)
+        & np.logical_or.accumulate(occupied[:, ::-1], axis=1)[:, ::-1]
+        & np.logical_or.accumulate(occupied, axis=0)
+        & np.logical_or.accumulate(occupied[::-1], axis=0)[::-1]
+    )
+    table = summed_area(~blocked)
+
+    # Outside cells in the ring just beyond each grown room
+    low, high = cells(tolerance, 1)
+    outside = table[high[:, 1], high[:, 0]] - table[low[:, 1], high[:, 0]] - table[high[:, 1], low[:, 0]] + table[low[:, 1], low[:, 0]]
+    return outside > 0
+
+
+def room_adjacency(bboxes, tolerance=DEFAULT_TOLERANCE, min_contact=DEFAULT_MIN_CONTACT):
+    """(edges, exterior) of the rooms of one page, see adjacency_edges and exterior_rooms"""
+    return adjacency_edges(bboxes, tolerance, min_contact), exterior_rooms(bboxes, tolerance)
+
+
+def shape_edges(shapes_data):
+    """
+    Edges between shapes as indices into shapes_data, from the per-page
+    "adjacent" lists of extract_shapes_from_page (shapes in page order).
+    """
+    page_starts = {}
+    for index, shape in enumerate(shapes_data):
+        page_starts.setdefault(shape["page"], index)
+    edges = [
+        (index, page_starts[shape["page"]] + neighbour)
+        for index, shape in enumerate(shapes_data)
+        for neighbour in shape.get("adjacent", ())
+        if index < page_starts[shape["page"]] + neighbour
+    ]
+    return np.array(edges, dtype=np.int64).reshape(-1, 2)
+
+
+def evaluate_adjacency(room_types, edges, exterior, adjacency_rules):
+    """
+    Check compiled adjacency rules against a room graph. room_types are the
+    rooms' types, edges an (edges x 2) array of room indices and exterior a
+    boolean array. Returns (violated, messages): a boolean array and, for
+    every violating room, the message of the first rule it breaks.
+    """
+    count = len(room_types)
+    type_names = {}
+    types = np.fromiter((type_names.setdefault(t.lower(), len(type_names)) for t in room_types), dtype=np.int64, count=count)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    # Both directions, so each rule only looks at the first column
+    sources = np.concatenate((edges[:, 0], edges[:, 1]))
+    targets = np.concatenate((edges[:, 1], edges[:, 0]))
+
+    violated = np.zeros(count, dtype=bool)
+    messages = [None] * count
+    for rule in adjacency_rules:
+        room_type = type_names.get(rule["room_type"])
+        if room_type is None:
+            continue
+        subject = types == room_type
+        if rule["relation"] == MUST_TOUCH_EXTERIOR:
+            failing = subject & ~np.asarray(exterior, dtype=bool)
+        else:
+            target_type = type_names.get(rule["target_type"], -1)
+            touches = np.zeros(count, dtype=bool)
+            touches[sources[types[targets] == target_type]] = True
+            failing = subject & (touches if rule["relation"] == MUST_NOT_ADJOIN else ~touches)
+        for row in np.flatnonzero(failing & ~violated).tolist():
+            messages[row] = rule["message"]
+        violated |= failing
+    return violated, messages
@@ -0,0 +1,320 @@
+"""
+Extraction benchmark suite.
+
+Times each stage of verification (opening the PDF, reading its drawings,
+shape extraction, scalar and batch compliance checks and optionally the
+whole /verify-pdf endpoint) over synthetic plans from create_test_pdf and
+over the real plans in MAP/ and backend/files/, and writes the results as
+JSON so runs can be compared between releases:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+--check-snapshot compares the shapes extracted from the real plans with a
+stored snapshot instead, and exits with status 1 when any plan's changed:
+
+    python benchmark.py --check-snapshot tests/corpus_shapes.json
+"""
+import argparse
+import asyncio
+import glob
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+# Rules come from insert_rules.sample_rules through the in-memory database
+# stand-in, so no MongoDB server is needed and nothing is written to one
+os.environ.setdefault('MONGODB_URL', 'memory://')
+os.environ.setdefault('RULES_CHANGE_STREAM', '0')
+# Endpoint timings must measure extraction, not results and pages kept on
+# disk by an earlier run; the memory tiers are cleared before each request
+os.environ['RESULT_CACHE_DIR'] = ''
+
+import fitz  # PyMuPDF
+import numpy as np
+from quart.datastructures import FileStorage
+
+import app as verification_app
+from compliance import check_compliance, evaluate_compliance, compile_rules
+from create_test_pdf import create_synthetic_plan
+from insert_rules import sample_rules
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = [os.path.join(REPO_ROOT, 'MAP'), os.path.join(REPO_ROOT, 'backend', 'files')]
+# Fields of each extracted shape compared by --check-snapshot
+SNAPSHOT_FIELDS = ('page', 'color', 'coordinates', 'labels', 'status')
+
+# 1 inch on paper = 8 feet, as the form fields of /verify-pdf give it
+SCALE_INFO = {
+    'value': '1',
+    'unit': 'inch',
+    'equals': '8',
+    'equals_unit': 'feet'
+}
+
+# (name, pages, rooms per page, colour jitter, clutter drawings per page)
+SYNTHETIC_CASES = [
+    ("synthetic-1x10", 1, 10, 0.0, 0),
+    ("synthetic-1x100", 1, 100, 0.0, 0),
+    ("synthetic-1x100-jitter-clutter", 1, 100, 0.02, 500),
+    ("synthetic-10x100", 10, 100, 0.0, 50),
+    ("synthetic-1x1000", 1, 1000, 0.01, 200)
+]
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times; returns (last result, timing summary in seconds)"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, {
+        "min": round(min(times), 6),
+        "median": round(statistics.median(times), 6),
+        "mean": round(statistics.fmean(times), 6)
+    }
+
+
+def read_drawings(pdf_source):
+    doc = verification_app.open_pdf(pdf_source)
+    count = sum(len(page.get_drawings()) for page in doc)
+    doc.close()
+    return count
+
+
+def scalar_compliance(shapes, building_rules):
+    return [check_compliance(shape["color"], shape["real_dimensions"], building_rules) for shape in shapes]
+
+
+def batch_compliance(shapes, building_rules):
+    real_dimensions = [shape["real_dimensions"] for shape in shapes]
+    return evaluate_compliance(
+        [shape["color"] for shape in shapes],
+        [dims["width"] for dims in real_dimensions],
+        [dims["height"] for dims in real_dimensions],
+        [dims["area"] for dims in real_dimensions],
+        [dims["unit"] for dims in real_dimensions],
+        building_rules
+    )
+
+
+async def post_verify_pdf(client, pdf_bytes, rules_document):
+    # Every request has to extract again, not just hit the result cache or
+    # take its pages from the page cache
+    verification_app.result_cache.clear()
+    verification_app.page_cache.clear()
+    response = await client.post('/verify-pdf', form={
+        'city': rules_document['cityName'],
+        'pincode': rules_document['pincode'],
+        'scale_value': SCALE_INFO['value'],
+        'scale_unit': SCALE_INFO['unit'],
+        'scale_equals': SCALE_INFO['equals'],
+        'scale_equals_unit': SCALE_INFO['equals_unit']
+    }, files={'file': FileStorage(io.BytesIO(pdf_bytes), filename='plan.pdf')})
+    if response.status_code != 200:
+        raise RuntimeError(f"/verify-pdf answered {response.status_code}: {await response.get_data(as_text=True)}")
+    return await response.get_json()
+
+
+def benchmark_document(name, source, pdf_bytes, building_rules, repeat, endpoint=None, expected_rooms=None):
+    """Benchmark one PDF; endpoint is (event loop, test client, rules document) or None"""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    pages = len(doc)
+    doc.close()
+
+    stages = {}
+    _, stages["open"] = timed(lambda: verification_app.open_pdf(pdf_bytes).close(), repeat)
+    drawings, stages["drawings"] = timed(lambda: read_drawings(pdf_bytes), repeat)
+    shapes, stages["extract"] = timed(
+        lambda: verification_app.extract_shapes_from_pdf(pdf_bytes, SCALE_INFO, building_rules), repeat
+    )
+    _, stages["compliance_scalar"] = timed(lambda: scalar_compliance(shapes, building_rules), repeat)
+    _, stages["compliance_batch"] = timed(lambda: batch_compliance(shapes, building_rules), repeat)
+    if endpoint is not None:
+        loop, client, rules_document = endpoint
+        _, stages["endpoint"] = timed(
+            lambda: loop.run_until_complete(post_verify_pdf(client, pdf_bytes, rules_document)), repeat
+        )
+
+    extract_time = stages["extract"]["median"]
+    result = {
+        "name": name,
+        "source": source,
+        "bytes": len(pdf_bytes),
+        "pages": pages,
+        "drawings": drawings,
+        "shapes": len(shapes),
+        "shapes_per_sec": round(len(shapes) / extract_time, 1) if extract_time else None,
+        "pages_per_sec": round(pages / extract_time, 1) if extract_time else None,
+        "stages": stages,
+        "peak_rss_kb": peak_rss_kb()
+    }
+    if expected_rooms is not None:
+        result["expected_rooms"] = expected_rooms
+    return result
+
+
+def synthetic_documents(cases):
+    for name, pages, rooms_per_page, jitter, clutter in cases:
+        buffer = io.BytesIO()
+        rooms = create_synthetic_plan(buffer, pages, rooms_per_page, jitter, clutter)
+        yield name, "synthetic", buffer.getvalue(), rooms
+
+
+def corpus_documents(directories):
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, '*.pdf'))):
+            with open(path, 'rb') as f:
+                yield os.path.basename(path), os.path.relpath(path, REPO_ROOT), f.read(), None
+
+
+def corpus_snapshot(directories, building_rules):
+    """{plan path: [shape fields]} of the shapes extracted from the real plans"""
+    snapshot = {}
+    for _, source, pdf_bytes, _ in corpus_documents(directories):
+        shapes = verification_app.extract_shapes_from_pdf(pdf_bytes, SCALE_INFO, building_rules)
+        snapshot[source] = [{field: shape[field] for field in SNAPSHOT_FIELDS} for shape in shapes]
+    return snapshot
+
+
+def check_snapshot(snapshot, expected):
+    """Print the plans whose shapes differ from the stored snapshot; returns whether all match"""
+    changed = sorted(source for source in set(snapshot) | set(expected) if snapshot.get(source) != expected.get(source))
+    for source in changed:
+        before, after = expected.get(source), snapshot.get(source)
+        print(f"{source}: {'-' if before is None else len(before)} -> {'-' if after is None else len(after)} shapes, changed")
+    print(f"{len(snapshot) - len(changed)} of {len(set(snapshot) | set(expected))} plans unchanged")
+    return not changed
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print the median time of each stage against a previous run"""
+    previous = {result["name"]: result for result in baseline["results"]}
+    print(f"{'document':40} {'stage':18} {'before':>10} {'after':>10} {'speedup':>8}")
+    for result in results:
+        old = previous.get(result["name"])
+        if old is None or "stages" not in old or "stages" not in result:
+            continue
+        for stage, timing in result["stages"].items():
+            if stage not in old["stages"]:
+                continue
+            before, after = old["stages"][stage]["median"], timing["median"]
+            speedup = f"{before / after:.2f}x" if after else "-"
+            print(f"{result['name'][:40]:40} {stage:18} {before:10.4f} {after:10.4f} {speedup:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF shape extraction and compliance checks")
+    parser.add_argument("--output", help="write the JSON report to this file (default: stdout)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the median is reported")
+    parser.add_argument("--corpus", nargs="*", default=DEFAULT_CORPUS, help="directories of real plans")
+    parser.add_argument("--no-synthetic", action="store_true", help="skip the synthetic plans")
+    parser.add_argument("--endpoint", action="store_true", help="also time POST /verify-pdf in-process")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    parser.add_argument("--write-snapshot", help="write the shapes extracted from the real plans to this file and exit")
+    parser.add_argument("--check-snapshot", help="compare the shapes extracted from the real plans with this file and exit")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    rules_document = sample_rules[0]
+    building_rules = compile_rules(rules_document)
+
+    if args.write_snapshot or args.check_snapshot:
+        snapshot = corpus_snapshot(args.corpus, building_rules)
+        if args.write_snapshot:
+            with open(args.write_snapshot, 'w') as f:
+                f.write(json.dumps(snapshot, indent=1, sort_keys=True) + "\n")
+            return
+        with open(args.check_snapshot) as f:
+            sys.exit(0 if check_snapshot(snapshot, json.load(f)) else 1)
+
+    endpoint = None
+    loop = asyncio.new_event_loop()
+    if args.endpoint:
+        client_context = verification_app.app.test_app()
+        test_app = loop.run_until_complete(client_context.__aenter__())
+        endpoint = (loop, test_app.test_client(), rules_document)
+
+    documents = [] if args.no_synthetic else list(synthetic_documents(SYNTHETIC_CASES))
+    documents.extend(corpus_documents(args.corpus))
+
+    results = []
+    try:
+        for name, source, pdf_bytes, expected_rooms in documents:
+            try:
+                result = benchmark_document(name, source, pdf_bytes, building_rules, args.repeat, endpoint, expected_rooms)
+            except Exception as e:
+                result = {"name": name, "source": source, "bytes": len(pdf_bytes), "error": str(e)}
+            results.append(result)
+            print(f"{name}: {result.get('shapes', '-')} shapes, "
+                  f"{result.get('shapes_per_sec', '-')} shapes/s", file=sys.stderr)
+    finally:
+        if endpoint is not None:
+            loop.run_until_complete(client_context.__aexit__(None, None, None))
+        loop.close()
+
+    timed_results = [result for result in results if "stages" in result]
+    total_shapes = sum(result["shapes"] for result in timed_results)
+    total_extract = sum(result["stages"]["extract"]["median"] for result in timed_results)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pymupdf": fitz.VersionBind,
+            "numpy": np.__version__,
+            "extraction_mode": verification_app.extraction_pool.mode if args.endpoint else "inline",
+            "repeat": args.repeat,
+            "scale": SCALE_INFO
+        },
+        "totals": {
+            "documents": len(results),
+            "errors": len(results) - len(timed_results),
+            "shapes": total_shapes,
+            "extract_seconds": round(total_extract, 6),
+            "shapes_per_sec": round(total_shapes / total_extract, 1) if total_extract else None,
+            "peak_rss_kb": peak_rss_kb()
+        },
+        "results": results
+    }
+
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
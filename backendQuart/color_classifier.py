@@ -0,0 +1,201 @@
+import functools
+import math
+
+import numpy as np
+from webcolors import rgb_to_name
+
+# Room fill colours of the PDF marker tool (RGB in 0-1)
+DEFAULT_PALETTE = {
+    "bedroom": [(0.30, 0.69, 0.31)],
+    "bathroom": [(1.00, 0.93, 0.23)],
+    "hall": [(0.96, 0.26, 0.21)],
+    "kitchen": [(0.61, 0.16, 0.69)],
+    "balcony": [(0.00, 0.50, 1.00)],    # Blue
+    "dining": [(1.00, 0.65, 0.00)],     # Orange
+    "study": [(0.50, 0.00, 0.50)]       # Purple
+}
+
+# Maximum CIE76 colour difference between a fill and its palette entry.
+# Around 2 is a just noticeable difference; the closest default entries
+# (kitchen and study) are about 16 apart.
+DEFAULT_TOLERANCE = 8.0
+
+# Bound on memoized fills per classifier, in case a plan uses gradients
+MAX_CACHED_COLORS = 4096
+
+# Bits kept per channel when classifying raster pixels through a lookup
+# table: 6 bits gives 2^18 entries, each colour at most 2/255 per channel
+# from the centre of its bin
+LOOKUP_BITS = 6
+
+
+def parse_color(value):
+    """Accept '#rrggbb' strings, 0-255 triples or 0-1 triples"""
+    if isinstance(value, str):
+        value = value.lstrip('#')
+        return tuple(int(value[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    value = tuple(float(c) for c in value[:3])
+    if any(c > 1 for c in value):
+        return tuple(c / 255 for c in value)
+    return value
+
+
+def parse_palette(colors):
+    """
+    Build a palette from the `colors` field of a rules document, a list of
+    {"name": room type, "hexColor": "#4caf50"} entries as used by the admin
+    colour management page. A {room type: colour or [colours]} dict works too.
+    """
+    palette = {}
+    if isinstance(colors, dict):
+        items = colors.items()
+    else:
+        items = ((entry.get('name'), entry.get('hexColor') or entry.get('rgb')) for entry in colors)
+    for name, values in items:
+        if not name or values is None:
+            continue
+        if isinstance(values, str) or (values and not isinstance(values[0], (list, tuple, str))):
+            values = [values]
+        palette.setdefault(name.lower(), []).extend(parse_color(v) for v in values)
+    return palette
+
+
+def srgb_to_lab(rgb):
+    """Convert an sRGB colour with components in 0-1 to CIE Lab (D65)"""
+    def linear(c):
+        return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+    def f(t):
+        return t ** (1 / 3) if t > 216 / 24389 else (24389 / 27 * t + 16) / 116
+
+    r, g, b = (linear(c) for c in rgb)
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / 0.95047
+    y = 0.2126 * r + 0.7152 * g + 0.0722 * b
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / 1.08883
+    fx, fy, fz = f(x), f(y), f(z)
+    return (116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz))
+
+
+def srgb_to_lab_array(rgb):
+    """srgb_to_lab for an array of colours, shape (..., 3) with components in 0-1"""
+    rgb = np.asarray(rgb, dtype=np.float64)
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    r, g, b = linear[..., 0], linear[..., 1], linear[..., 2]
+    xyz = np.stack((
+        (0.4124 * r + 0.3576 * g + 0.1805 * b) / 0.95047,
+        0.2126 * r + 0.7152 * g + 0.0722 * b,
+        (0.0193 * r + 0.1192 * g + 0.9505 * b) / 1.08883
+    ), axis=-1)
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
+    return np.stack((116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)), axis=-1)
+
+
+# Steps between two washed-out shades of a palette colour in a lookup table
+WASH_STEP = 0.05
+
+
+@functools.lru_cache(maxsize=16)
+def palette_lookup_table(entries, tolerance, bits, wash=0.0):
+    """
+    Index into the entries' room types (in order of first appearance) for
+    every RGB colour quantized to `bits` per channel, -1 where no entry is
+    within `tolerance`. entries is a tuple of (RGB, room type) pairs.
+
+    Each entry also matches its colour mixed with up to `wash` white, as
+    fills look under a translucent drawing laid over them.
+    """
+    levels = 1 << bits
+    centres = (np.arange(levels) + 0.5) / levels
+    grid = np.stack(np.meshgrid(centres, centres, centres, indexing="ij"), axis=-1).reshape(-1, 3)
+    lab = srgb_to_lab_array(grid)
+    names = list(dict.fromkeys(room_type for _, room_type in entries))
+    nearest = np.full(len(grid), np.inf)
+    table = np.full(len(grid), -1, dtype=np.int16)
+    mixes = np.linspace(0, wash, int(np.ceil(wash / WASH_STEP)) + 1)
+    for entry_rgb, room_type in entries:
+        rgb = np.asarray(entry_rgb)
+        shades = srgb_to_lab_array(rgb + (1 - rgb) * mixes[:, None])
+        distance = np.full(len(grid), np.inf)
+        for shade in shades:
+            distance = np.minimum(distance, np.sqrt(((lab - shade) ** 2).sum(axis=1)))
+        closer = distance < nearest
+        nearest[closer] = distance[closer]
+        table[closer] = names.index(room_type)
+    table[nearest > tolerance] = -1
+    return table, tuple(names)
+
+
+@functools.lru_cache(maxsize=MAX_CACHED_COLORS)
+def get_color_name(rgb):
+    try:
+        return rgb_to_name(tuple(int(c * 255) for c in rgb))
+    except ValueError:
+        return f"RGB({rgb[0]:.2f}, {rgb[1]:.2f}, {rgb[2]:.2f})"
+
+
+class ColorClassifier:
+    """
+    Maps fill colours to room types by nearest palette entry in Lab space,
+    accepting matches within `tolerance`. A plan has only a handful of
+    distinct fills, so results are memoized per fill colour.
+    """
+
+    def __init__(self, palette=None, tolerance=DEFAULT_TOLERANCE):
+        palette = palette or DEFAULT_PALETTE
+        self.tolerance = tolerance
+        self.colors = [
+            (tuple(rgb), room_type)
+            for room_type, colors in palette.items()
+            for rgb in colors
+        ]
+        self.entries = [(srgb_to_lab(rgb), room_type) for rgb, room_type in self.colors]
+        self.cache = {}
+
+    @classmethod
+    def for_rules(cls, building_rules, tolerance=DEFAULT_TOLERANCE):
+        """Classifier for a rule set's own palette, falling back to the default one"""
+        colors = getattr(building_rules, 'colors', None)
+        if colors is None and isinstance(building_rules, dict):
+            colors = building_rules.get('colors')
+        palette = parse_palette(colors) if colors else None
+        return cls(palette, tolerance) if palette else default_classifier
+
+    def room_type(self, rgb):
+        """Room type for a fill colour, or None when no palette entry is close enough"""
+        rgb = tuple(rgb)
+        try:
+            return self.cache[rgb]
+        except KeyError:
+            pass
+        lab = srgb_to_lab(rgb)
+        distance, room_type = min(
+            ((math.dist(lab, entry_lab), entry_room_type) for entry_lab, entry_room_type in self.entries),
+            default=(math.inf, None)
+        )
+        result = room_type if distance <= self.tolerance else None
+        if len(self.cache) >= MAX_CACHED_COLORS:
+            self.cache.clear()
+        self.cache[rgb] = result
+        return result
+
+    def lookup_table(self, tolerance=None, bits=LOOKUP_BITS, wash=0.0):
+        """
+        (table, room types) classifying many pixels at once: the room type
+        of an 8-bit RGB pixel is room_types[table[index]] with index the
+        top `bits` of each channel packed red first, or none when the table
+        holds -1. See palette_lookup_table for `wash`.
+        Tables are shared by classifiers with the same palette.
+        """
+        return palette_lookup_table(tuple(self.colors), self.tolerance if tolerance is None else tolerance, bits, wash)
+
+    def label(self, rgb):
+        """Room type for a fill colour, or its colour name when it is not a room colour"""
+        return self.room_type(rgb) or get_color_name(tuple(rgb))
+
+
+default_classifier = ColorClassifier()
+
+
+def get_room_type_from_color(rgb):
+    return default_classifier.room_type(rgb)
@@ -0,0 +1,416 @@
+import logging
+import numbers
+
+import numpy as np
+
+from adjacency import compile_adjacency_rules, evaluate_adjacency, shape_edges
+
+logger = logging.getLogger(__name__)
+
+# Reason codes reported by evaluate_compliance, in the order the checks run
+REASON_COMPLIANT = 0
+REASON_NO_RULE = 1
+REASON_MIN_AREA = 2
+REASON_MIN_WIDTH = 3
+REASON_MAX_AREA = 4
+REASON_MAX_WIDTH = 5
+REASON_ADDITIONAL = 6
+REASON_OTHER = 7
+REASON_ADJACENCY = 8
+
+REASON_NAMES = {
+    REASON_COMPLIANT: "compliant",
+    REASON_NO_RULE: "no_rule",
+    REASON_MIN_AREA: "min_area",
+    REASON_MIN_WIDTH: "min_width",
+    REASON_MAX_AREA: "max_area",
+    REASON_MAX_WIDTH: "max_width",
+    REASON_ADDITIONAL: "additional_requirements",
+    REASON_OTHER: "other",
+    REASON_ADJACENCY: "adjacency"
+}
+
+# (width/height factor, area factor) to bring dimensions measured in the first
+# unit into the rule's unit, the second
+UNIT_CONVERSIONS = {
+    ('feet', 'meters'): (0.3048, 0.0929),
+    ('meters', 'feet'): (3.28084, 10.7639)
+}
+
+
+class CompiledRules(dict):
+    """
+    Rules of one building rules document keyed by lower-cased room type.
+    Only the first rule for a room type is kept, as the old linear scan did.
+    The document's optional room colour palette is kept as `colors` and its
+    compiled `adjacencyRules` (see adjacency.py) as `adjacency`.
+    """
+    colors = None
+    adjacency = ()
+
+
+def compile_rules(building_rules):
+    """
+    Index a building rules document by room type. Already compiled rules are
+    returned unchanged so callers can pass either form.
+    """
+    if isinstance(building_rules, CompiledRules):
+        return building_rules
+
+    compiled = CompiledRules()
+    compiled.colors = building_rules.get('colors')
+    compiled.adjacency = compile_adjacency_rules(building_rules.get('adjacencyRules'))
+    for rule in building_rules['rules']:
+        room_type = rule['roomType'].lower()
+        if room_type in compiled:
+            continue
+        dimensions = rule['dimensions']
+        rule_unit = dimensions.get('unit')
+        compiled[room_type] = {
+            "roomType": rule['roomType'],
+            "dimensions": dimensions,
+            "additionalRequirements": rule.get('additionalRequirements'),
+            # Pre-resolved unit conversion for each possible measured unit
+            "conversions": {
+                measured_unit: factors
+                for (measured_unit, target_unit), factors in UNIT_CONVERSIONS.items()
+                if target_unit == rule_unit
+            }
+        }
+    return compiled
+
+
+def check_compliance(room_type, real_dimensions, building_rules, residential_type=None):
+    """
+    Check if room dimensions comply with minimum requirements from database rules
+    """
+    try:
+        # Find the matching rule for this room type
+        room_rule = compile_rules(building_rules).get(room_type.lower())
+
+        if room_rule:
+            rule_dimensions = room_rule['dimensions']
+            # Convert dimensions to the rule's unit if necessary
+            rule_unit = rule_dimensions['unit']
+            if rule_unit != real_dimensions['unit']:
+                factors = room_rule['conversions'].get(real_dimensions['unit'])
+                if factors:
+                    length_factor, area_factor = factors
+                    real_dimensions = {
+                        'width': real_dimensions['width'] * length_factor,
+                        'height': real_dimensions['height'] * length_factor,
+                        'area': real_dimensions['area'] * area_factor,
+                        'unit': rule_unit
+                    }
+
+            # Check minimum area
+            if real_dimensions['area'] < rule_dimensions['minArea']:
+                return False, f"Area is below minimum requirement of {rule_dimensions['minArea']} {rule_dimensions['unit']}"
+
+            # Check minimum width
+            min_dimension = min(real_dimensions['width'], real_dimensions['height'])
+            if min_dimension < rule_dimensions['minWidth']:
+                return False, f"Width/Length is below minimum requirement of {rule_dimensions['minWidth']} {rule_dimensions['unit']}"
+
+            # Check maximum dimensions if specified
+            if 'maxArea' in rule_dimensions and rule_dimensions['maxArea']:
+                if real_dimensions['area'] > rule_dimensions['maxArea']:
+                    return False, f"Area exceeds maximum requirement of {rule_dimensions['maxArea']} {rule_dimensions['unit']}"
+
+            if 'maxWidth' in rule_dimensions and rule_dimensions['maxWidth']:
+                max_dimension = max(real_dimensions['width'], real_dimensions['height'])
+                if max_dimension > rule_dimensions['maxWidth']:
+                    return False, f"Width/Length exceeds maximum requirement of {rule_dimensions['maxWidth']} {rule_dimensions['unit']}"
+
+            # Check additional requirements if specified
+            if room_rule.get('additionalRequirements'):
+                return False, room_rule['additionalRequirements']
+
+            return True, "Compliant with building rules"
+
+        # If no specific rule found for this room type
+        return True, "No specific rules found for this room type"
+
+    except Exception as e:
+        logger.error(f"Error checking compliance: {str(e)}")
+        return False, f"Error checking compliance: {str(e)}"
+
+
+def is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def is_vectorizable(room_rule):
+    """
+    True when a rule only holds plain numeric limits. Anything unusual (missing
+    keys, string limits) goes through check_compliance so error messages stay
+    exactly as before.
+    """
+    dimensions = room_rule['dimensions']
+    if 'unit' not in dimensions:
+        return False
+    if not is_number(dimensions.get('minArea')) or not is_number(dimensions.get('minWidth')):
+        return False
+    for key in ('maxArea', 'maxWidth'):
+        if dimensions.get(key) and not is_number(dimensions[key]):
+            return False
+    return True
+
+
+def rule_messages(room_rule):
+    """Messages of check_compliance for one rule, indexed by reason code"""
+    dimensions = room_rule['dimensions']
+    unit = dimensions['unit']
+    return {
+        REASON_COMPLIANT: "Compliant with building rules",
+        REASON_MIN_AREA: f"Area is below minimum requirement of {dimensions['minArea']} {unit}",
+        REASON_MIN_WIDTH: f"Width/Length is below minimum requirement of {dimensions['minWidth']} {unit}",
+        REASON_MAX_AREA: f"Area exceeds maximum requirement of {dimensions.get('maxArea')} {unit}",
+        REASON_MAX_WIDTH: f"Width/Length exceeds maximum requirement of {dimensions.get('maxWidth')} {unit}",
+        REASON_ADDITIONAL: room_rule.get('additionalRequirements')
+    }
+
+
+def encode_values(values, normalize=None):
+    """
+    Return (codes, distinct values) for a list of hashable values. normalize,
+    if given, is applied to the distinct values only and equal results share
+    a code.
+    """
+    index = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int32, count=len(values))
+    if normalize is None:
+        return codes, list(index)
+    normalized_index = {}
+    remap = np.array([normalized_index.setdefault(normalize(v), len(normalized_index)) for v in index], dtype=np.int32)
+    return remap[codes] if len(codes) else codes, list(normalized_index)
+
+
+def evaluate_compliance(room_types, widths, heights, areas, units, building_rules, edges=None, exterior=None):
+    """
+    Batch version of check_compliance for all rooms of a plan at once.
+
+    room_types and units are sequences of strings; widths, heights and areas
+    are the real dimensions as numbers. Returns (compliant, reasons, messages)
+    where compliant is a bool array, reasons an array of REASON_* codes and
+    messages a list of strings, all identical to what check_compliance gives
+    room by room. Rooms whose rule has to be checked one by one report
+    REASON_OTHER when they fail.
+
+    When the room graph is given (edges between room indices and the
+    exterior flags, see adjacency.py), rooms that pass their dimension checks
+    are also checked against the adjacency rules and report
+    REASON_ADJACENCY with the rule's message when they break one.
+    """
+    rule_index = compile_rules(building_rules)
+    count = len(room_types)
+    widths = np.asarray(widths, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    areas = np.asarray(areas, dtype=np.float64)
+
+    type_codes, type_names = encode_values(room_types, normalize=str.lower)
+    unit_codes, unit_names = encode_values(units)
+
+    reasons = np.full(count, REASON_NO_RULE, dtype=np.int8)
+    message_codes = np.zeros(count, dtype=np.int32)
+    message_table = ["No specific rules found for this room type"]
+    scalar_rows = []
+
+    for type_code, room_type in enumerate(type_names):
+        room_rule = rule_index.get(room_type)
+        if not room_rule:
+            continue
+        rows = np.flatnonzero(type_codes == type_code)
+        if not is_vectorizable(room_rule):
+            scalar_rows.extend(rows.tolist())
+            continue
+
+        dimensions = room_rule['dimensions']
+        rule_unit = dimensions['unit']
+
+        # Per-row unit conversion into the rule's unit
+        length_factors = np.ones(len(unit_names))
+        area_factors = np.ones(len(unit_names))
+        for unit_code, unit in enumerate(unit_names):
+            factors = room_rule['conversions'].get(unit)
+            if unit != rule_unit and factors:
+                length_factors[unit_code], area_factors[unit_code] = factors
+        row_units = unit_codes[rows]
+        width = widths[rows] * length_factors[row_units]
+        height = heights[rows] * length_factors[row_units]
+        area = areas[rows] * area_factors[row_units]
+
+        # min()/max() semantics of the scalar check: first argument unless the second is strictly smaller/larger
+        min_dimension = np.where(height < width, height, width)
+        max_dimension = np.where(height > width, height, width)
+
+        conditions = [area < dimensions['minArea'], min_dimension < dimensions['minWidth']]
+        choices = [REASON_MIN_AREA, REASON_MIN_WIDTH]
+        if dimensions.get('maxArea'):
+            conditions.append(area > dimensions['maxArea'])
+            choices.append(REASON_MAX_AREA)
+        if dimensions.get('maxWidth'):
+            conditions.append(max_dimension > dimensions['maxWidth'])
+            choices.append(REASON_MAX_WIDTH)
+        default = REASON_ADDITIONAL if room_rule.get('additionalRequirements') else REASON_COMPLIANT
+        rule_reasons = np.select(conditions, choices, default=default).astype(np.int8)
+        reasons[rows] = rule_reasons
+
+        # Messages are formatted once per rule and reason, then indexed
+        offset = len(message_table)
+        messages = rule_messages(room_rule)
+        message_table.extend(messages.get(reason) for reason in range(REASON_OTHER))
+        message_codes[rows] = offset + rule_reasons
+
+    compliant = (reasons == REASON_COMPLIANT) | (reasons == REASON_NO_RULE)
+    messages = np.array(message_table, dtype=object)[message_codes].tolist()
+
+    for row in scalar_rows:
+        real_dimensions = {
+            'width': widths[row].item(),
+            'height': heights[row].item(),
+            'area': areas[row].item(),
+            'unit': units[row]
+        }
+        is_compliant, message = check_compliance(room_types[row], real_dimensions, rule_index)
+        compliant[row] = is_compliant
+        reasons[row] = REASON_COMPLIANT if is_compliant else REASON_OTHER
+        messages[row] = message
+
+    if rule_index.adjacency and edges is not None:
+        violated, adjacency_messages = evaluate_adjacency(room_types, edges, exterior, rule_index.adjacency)
+        # Dimension failures come first, as only the first failure is reported
+        for row in np.flatnonzero(violated & compliant).tolist():
+            compliant[row] = False
+            reasons[row] = REASON_ADJACENCY
+            messages[row] = adjacency_messages[row]
+
+    return compliant, reasons, messages
+
+
+def room_graph(shapes_data):
+    """(edges, exterior) of shapes carrying "adjacent"/"exterior", or (None, None)"""
+    if not shapes_data or "exterior" not in shapes_data[0]:
+        return None, None
+    return shape_edges(shapes_data), np.array([shape["exterior"] for shape in shapes_data], dtype=bool)
+
+
+def apply_compliance(shapes_data, building_rules):
+    """Evaluate all shapes in one batch and fill in their status and message"""
+    if not shapes_data:
+        return shapes_data
+    real_dimensions = [shape["real_dimensions"] for shape in shapes_data]
+    compliant, _, messages = evaluate_compliance(
+        [shape["color"] for shape in shapes_data],
+        [dims["width"] for dims in real_dimensions],
+        [dims["height"] for dims in real_dimensions],
+        [dims["area"] for dims in real_dimensions],
+        [dims["unit"] for dims in real_dimensions],
+        building_rules,
+        *room_graph(shapes_data)
+    )
+    for shape, is_compliant, message in zip(shapes_data, compliant.tolist(), messages):
+        shape["status"] = "Compliant" if is_compliant else "Non-Compliant"
+        shape["message"] = message
+    return shapes_data
+
+
+def evaluate_compliance_matrix(room_types, widths, heights, areas, units, rule_sets, edges=None, exterior=None, max_cells=1 << 20):
+    """
+    evaluate_compliance of the same rooms (and room graph, when given)
+    against several building rules documents at once. The limits of every rule set are laid out as
+    (rule sets x room types) tables, so all rule sets are checked with the
+    same few array operations instead of one pass each. Returns (compliant,
+    reasons) as (rooms x rule sets) arrays, equal column by column to what
+    evaluate_compliance gives. Rule sets are processed in chunks of at most
+    max_cells room/rule set pairs to bound memory.
+    """
+    indexes = [compile_rules(rules) for rules in rule_sets]
+    count, sets = len(room_types), len(indexes)
+    widths = np.asarray(widths, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    areas = np.asarray(areas, dtype=np.float64)
+
+    type_codes, type_names = encode_values(room_types, normalize=str.lower)
+    unit_codes, unit_names = encode_values(units)
+    shape = (sets, len(type_names))
+
+    has_rule = np.zeros(shape, dtype=bool)
+    vectorized = np.zeros(shape, dtype=bool)
+    additional = np.zeros(shape, dtype=bool)
+    # NaN limits never trigger, like a missing or zero maxArea/maxWidth
+    min_area = np.full(shape, np.nan)
+    min_width = np.full(shape, np.nan)
+    max_area = np.full(shape, np.nan)
+    max_width = np.full(shape, np.nan)
+    length_factors = np.ones(shape + (len(unit_names),))
+    area_factors = np.ones(shape + (len(unit_names),))
+
+    for set_index, rule_index in enumerate(indexes):
+        for type_code, room_type in enumerate(type_names):
+            room_rule = rule_index.get(room_type)
+            if not room_rule:
+                continue
+            has_rule[set_index, type_code] = True
+            if not is_vectorizable(room_rule):
+                continue
+            vectorized[set_index, type_code] = True
+            dimensions = room_rule['dimensions']
+            min_area[set_index, type_code] = dimensions['minArea']
+            min_width[set_index, type_code] = dimensions['minWidth']
+            if dimensions.get('maxArea'):
+                max_area[set_index, type_code] = dimensions['maxArea']
+            if dimensions.get('maxWidth'):
+                max_width[set_index, type_code] = dimensions['maxWidth']
+            additional[set_index, type_code] = bool(room_rule.get('additionalRequirements'))
+            for unit_code, unit in enumerate(unit_names):
+                factors = room_rule['conversions'].get(unit)
+                if unit != dimensions['unit'] and factors:
+                    length_factors[set_index, type_code, unit_code], area_factors[set_index, type_code, unit_code] = factors
+
+    reasons = np.full((sets, count), REASON_NO_RULE, dtype=np.int8)
+    chunk = max(1, max_cells // max(count, 1))
+    for start in range(0, sets, chunk):
+        block = slice(start, start + chunk)
+        # (rule sets x rooms) views of the tables for this chunk
+        width = widths * length_factors[block][:, type_codes, unit_codes]
+        height = heights * length_factors[block][:, type_codes, unit_codes]
+        area = areas * area_factors[block][:, type_codes, unit_codes]
+        min_dimension = np.where(height < width, height, width)
+        max_dimension = np.where(height > width, height, width)
+        default = np.where(additional[block][:, type_codes], REASON_ADDITIONAL, REASON_COMPLIANT)
+        block_reasons = np.select(
+            [
+                area < min_area[block][:, type_codes],
+                min_dimension < min_width[block][:, type_codes],
+                area > max_area[block][:, type_codes],
+                max_dimension > max_width[block][:, type_codes]
+            ],
+            [REASON_MIN_AREA, REASON_MIN_WIDTH, REASON_MAX_AREA, REASON_MAX_WIDTH],
+            default=default
+        )
+        reasons[block] = np.where(vectorized[block][:, type_codes], block_reasons, REASON_NO_RULE)
+
+    # Rules with unusual limits are checked room by room, as evaluate_compliance does
+    for set_index, type_code in zip(*np.nonzero(has_rule & ~vectorized)):
+        for row in np.flatnonzero(type_codes == type_code).tolist():
+            real_dimensions = {
+                'width': widths[row].item(),
+                'height': heights[row].item(),
+                'area': areas[row].item(),
+                'unit': units[row]
+            }
+            is_compliant, _ = check_compliance(room_types[row], real_dimensions, indexes[set_index])
+            reasons[set_index, row] = REASON_COMPLIANT if is_compliant else REASON_OTHER
+
+    # Adjacency rules only concern the rule sets that have them
+    if edges is not None:
+        for set_index, rule_index in enumerate(indexes):
+            if rule_index.adjacency:
+                violated, _ = evaluate_adjacency(room_types, edges, exterior, rule_index.adjacency)
+                passing = (reasons[set_index] == REASON_COMPLIANT) | (reasons[set_index] == REASON_NO_RULE)
+                reasons[set_index, violated & passing] = REASON_ADJACENCY
+
+    reasons = reasons.T
+    compliant = (reasons == REASON_COMPLIANT) | (reasons == REASON_NO_RULE)
+    return compliant, reasons
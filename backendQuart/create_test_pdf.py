@@ -1,6 +1,12 @@
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
+from reportlab.lib.pagesizes import A3, landscape
+import argparse
+import math
 import os
+import random
+
+from color_classifier import DEFAULT_PALETTE
 
 def create_test_pdf():
     # Create a PDF file
@@ -39,5 +45,76 @@ def create_test_pdf():
     c.save()
     print("Test PDF created successfully")
 
+def jitter_color(rgb, amount, rng):
+    return tuple(min(1.0, max(0.0, c + rng.uniform(-amount, amount))) for c in rgb)
+
+def create_synthetic_plan(output, pages=1, rooms_per_page=20, color_jitter=0.0, clutter=0, labels=True, seed=0):
+    """
+    Draw a synthetic floor plan for benchmarking: `rooms_per_page` filled
+    rooms in the default room palette on a grid, each colour channel moved by
+    up to `color_jitter` (0-1), plus `clutter` non-room drawings per page
+    (walls, dimension lines, outlines). output is a file name or a binary
+    file object. Returns the number of rooms drawn.
+    """
+    rng = random.Random(seed)
+    page_width, page_height = landscape(A3)
+    margin = 36
+    columns = max(1, math.ceil(math.sqrt(rooms_per_page * page_width / page_height)))
+    rows = max(1, math.ceil(rooms_per_page / columns))
+    cell_width = (page_width - 2 * margin) / columns
+    cell_height = (page_height - 2 * margin) / rows
+    room_types = list(DEFAULT_PALETTE)
+
+    c = canvas.Canvas(output, pagesize=(page_width, page_height))
+    rooms = 0
+    for _ in range(pages):
+        # Clutter first so rooms are drawn on top, as in real plans
+        c.setLineWidth(0.5)
+        for _ in range(clutter):
+            x, y = rng.uniform(margin, page_width - margin), rng.uniform(margin, page_height - margin)
+            kind = rng.randrange(3)
+            if kind == 0:
+                # Wall segment: black fill is ignored by the extractor
+                c.setFillColor(colors.black)
+                c.rect(x, y, rng.uniform(20, 200), rng.uniform(2, 6), fill=1, stroke=0)
+            elif kind == 1:
+                c.line(x, y, x + rng.uniform(-100, 100), y + rng.uniform(-100, 100))
+            else:
+                c.rect(x, y, rng.uniform(10, 80), rng.uniform(10, 80), fill=0, stroke=1)
+
+        for index in range(rooms_per_page):
+            room_type = room_types[rng.randrange(len(room_types))]
+            fill = jitter_color(DEFAULT_PALETTE[room_type][0], color_jitter, rng)
+            column, row = index % columns, index // columns
+            width = cell_width * rng.uniform(0.5, 0.9)
+            height = cell_height * rng.uniform(0.5, 0.9)
+            x = margin + column * cell_width + (cell_width - width) / 2
+            y = margin + row * cell_height + (cell_height - height) / 2
+            c.setFillColorRGB(*fill)
+            c.rect(x, y, width, height, fill=1, stroke=0)
+            if labels:
+                c.setFillColor(colors.black)
+                c.setFont("Helvetica", 6)
+                c.drawCentredString(x + width / 2, y + height / 2, room_type.upper())
+            rooms += 1
+        c.showPage()
+
+    c.save()
+    return rooms
+
 if __name__ == "__main__":
-    create_test_pdf() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create test floor plans. Without options the five room test plan is written.")
+    parser.add_argument("--synthetic", help="write a synthetic plan to this file instead")
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--rooms", type=int, default=20, help="rooms per page")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximum colour change per channel (0-1)")
+    parser.add_argument("--clutter", type=int, default=0, help="non-room drawings per page")
+    parser.add_argument("--no-labels", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        rooms = create_synthetic_plan(args.synthetic, args.pages, args.rooms, args.jitter, args.clutter, not args.no_labels, args.seed)
+        print(f"Synthetic plan with {rooms} rooms on {args.pages} pages written to {args.synthetic}")
+    else:
+        create_test_pdf()
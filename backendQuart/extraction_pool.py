@@ -0,0 +1,316 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_MODES = ('inline', 'thread', 'process')
+
+
+class ExtractionQueueFull(Exception):
+    """Raised when the pool already holds the maximum number of pending jobs"""
+
+
+class ExtractionTimeout(Exception):
+    """Raised when a job does not finish within its time budget"""
+
+
+class ExtractionCancelled(Exception):
+    """Raised inside a worker once a job's deadline has passed"""
+
+
+class ExtractionMemoryExceeded(Exception):
+    """Raised inside a worker when its memory use is over the configured ceiling"""
+
+
+# Resident memory ceiling in bytes of the process running extraction jobs
+memory_limit = None
+# Seconds between two checks of a worker process that its server is alive
+PARENT_CHECK_INTERVAL = 1.0
+
+
+def set_memory_limit(limit):
+    """Set the memory ceiling of this process (worker initializer); None or 0 disables it"""
+    global memory_limit
+    memory_limit = limit or None
+
+
+def resident_memory():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Peak size where /proc is not available; ru_maxrss is in bytes on
+        # macOS and in kilobytes elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def check_deadline(deadline):
+    """
+    Cooperative cancellation point for long running extraction jobs.
+    Workers call this between pages so a timed out or abandoned job stops
+    holding a process instead of running to completion.
+    """
+    if deadline is not None and time.time() > deadline:
+        raise ExtractionCancelled("Extraction job cancelled: deadline exceeded")
+
+
+def check_memory(release=None):
+    """
+    Memory checkpoint for extraction jobs, called between pages. When the
+    process is over the ceiling, `release` (e.g. dropping cached document
+    resources) gets a chance to bring it back under before the job fails
+    with ExtractionMemoryExceeded.
+    """
+    if memory_limit is None or resident_memory() <= memory_limit:
+        return
+    if release is not None:
+        release()
+        if resident_memory() <= memory_limit:
+            return
+    raise ExtractionMemoryExceeded(
+        f"Plan needs more than the {memory_limit // (1024 * 1024)} MB of memory allowed for extraction"
+    )
+
+
+def watch_parent(parent_pid):
+    """
+    Exit this worker process once `parent_pid` is no longer its parent. A
+    server terminated without shutting its pool down (hypercorn terminates
+    its worker processes) would otherwise leave its workers waiting for jobs
+    forever.
+    """
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(PARENT_CHECK_INTERVAL)
+        os._exit(1)
+
+    threading.Thread(target=watch, name='parent-watch', daemon=True).start()
+
+
+def init_worker(limit, parent_pid):
+    """Initializer of extraction worker processes"""
+    set_memory_limit(limit)
+    watch_parent(parent_pid)
+
+
+def allow_child_processes():
+    """
+    Let this process start worker processes even when it is daemonic, as
+    hypercorn's workers are: multiprocessing refuses children there because
+    a daemonic process is terminated without waiting for them, which
+    watch_parent() takes care of. Returns whether the process was daemonic.
+    """
+    process = multiprocessing.current_process()
+    if not process.daemon:
+        return False
+    process.daemon = False
+    return True
+
+
+class ExtractionPool:
+    """
+    Runs blocking PDF extraction off the event loop.
+
+    mode:
+    - inline: run in the calling coroutine (old behaviour, blocks the loop)
+    - thread: run in a thread pool
+    - process: run in a process pool, one PDF per worker process
+
+    At most `max_pending` jobs may be queued or running at once; further
+    submissions fail fast with ExtractionQueueFull so the caller can shed load.
+    Every job gets a wall-clock deadline which is handed to the worker function
+    as the `deadline` keyword argument. `memory_limit` is the resident memory
+    ceiling of a worker enforced by check_memory(): of each worker process in
+    process mode; threads share the server process, whose ceiling in thread
+    mode is `memory_limit` times the number of workers. Process mode works in daemonic server processes too (see
+    allow_child_processes); where worker processes cannot be started at all
+    the pool falls back to thread mode with a warning.
+    """
+
+    def __init__(self, mode='process', max_workers=None, max_pending=None, timeout=None, memory_limit=None):
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown extraction mode '{mode}', expected one of {EXECUTION_MODES}")
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.timeout = timeout
+        self.memory_limit = memory_limit or None
+        if mode != 'process':
+            set_memory_limit(self.server_memory_limit())
+        self.executor = None
+        self.pending = 0
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "cancelled": 0
+        }
+
+    def server_memory_limit(self):
+        """Memory ceiling of the server process when jobs run in it"""
+        if self.memory_limit is None or self.mode != 'thread':
+            return self.memory_limit
+        return self.memory_limit * self.max_workers
+
+    def start(self):
+        if self.executor is not None or self.mode == 'inline':
+            return
+        if self.mode == 'process':
+            try:
+                if allow_child_processes():
+                    logger.info("Server process is daemonic, starting extraction worker processes from it anyway")
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers, initializer=init_worker,
+                    initargs=(self.memory_limit, os.getpid())
+                )
+            except (NotImplementedError, OSError) as e:
+                logger.warning(f"Cannot start the extraction process pool ({e}), using threads instead")
+                self.mode = 'thread'
+                set_memory_limit(self.server_memory_limit())
+        if self.mode == 'thread':
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='extraction'
+            )
+        logger.info(f"Started {self.mode} extraction pool with {self.max_workers} workers "
+                    f"(max pending: {self.max_pending}, timeout: {self.timeout}s)")
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+            self.executor = None
+
+    def deadline(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        return time.time() + timeout if timeout else None
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        """
+        Run fn(*args, deadline=..., **kwargs) according to the pool mode and
+        return its result.
+        """
+        results = await self.map(fn, [args], timeout=timeout, **kwargs)
+        return results[0]
+
+    async def map(self, fn, args_list, timeout=None, **kwargs):
+        """
+        Run fn(*args, deadline=..., **kwargs) for every args tuple in args_list
+        concurrently and return the results in the same order. The calls share
+        one queue slot and one deadline, and are cancelled together.
+        """
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise ExtractionQueueFull(
+                f"Extraction queue is full ({self.pending} jobs pending), try again later"
+            )
+
+        timeout = self.timeout if timeout is None else timeout
+        kwargs['deadline'] = self.deadline(timeout)
+        self.pending += 1
+        self.stats["submitted"] += 1
+        try:
+            if self.mode == 'inline':
+                results = [fn(*args, **kwargs) for args in args_list]
+            else:
+                self.start()
+                futures = [self.executor.submit(fn, *args, **kwargs) for args in args_list]
+                try:
+                    results = await asyncio.wait_for(
+                        asyncio.gather(*(asyncio.wrap_future(f) for f in futures)), timeout
+                    )
+                except asyncio.TimeoutError:
+                    # Jobs that have not started yet are dropped here; running
+                    # ones stop at their next check_deadline() call.
+                    for future in futures:
+                        future.cancel()
+                    self.stats["timed_out"] += 1
+                    raise ExtractionTimeout(f"Extraction did not finish within {timeout} seconds")
+                except asyncio.CancelledError:
+                    for future in futures:
+                        future.cancel()
+                    self.stats["cancelled"] += 1
+                    raise
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            self.stats["completed"] += 1
+            return results
+        except ExtractionCancelled:
+            self.stats["timed_out"] += 1
+            raise ExtractionTimeout(f"Extraction did not finish within {timeout} seconds")
+        except (ExtractionTimeout, asyncio.CancelledError):
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    async def imap(self, fn, args_list, timeout=None, window=None, **kwargs):
+        """
+        Like map() but an async generator yielding each result, in order, as
+        soon as it and all results before it are ready. At most `window` calls
+        (default: number of workers) are in flight, which bounds the memory
+        held for results the consumer has not taken yet.
+        """
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise ExtractionQueueFull(
+                f"Extraction queue is full ({self.pending} jobs pending), try again later"
+            )
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = self.deadline(timeout)
+        kwargs['deadline'] = deadline
+        window = window or self.max_workers
+        args_list = list(args_list)
+        futures = []
+        self.pending += 1
+        self.stats["submitted"] += 1
+        try:
+            if self.mode == 'inline':
+                for args in args_list:
+                    yield fn(*args, **kwargs)
+            else:
+                self.start()
+                next_index = 0
+                for index in range(len(args_list)):
+                    while next_index < len(args_list) and next_index < index + window:
+                        futures.append(self.executor.submit(fn, *args_list[next_index], **kwargs))
+                        next_index += 1
+                    remaining = deadline - time.time() if deadline else None
+                    try:
+                        result = await asyncio.wait_for(asyncio.wrap_future(futures[index]), remaining)
+                    except asyncio.TimeoutError:
+                        self.stats["timed_out"] += 1
+                        raise ExtractionTimeout(f"Extraction did not finish within {timeout} seconds")
+                    futures[index] = None
+                    yield result
+            self.stats["completed"] += 1
+        except ExtractionCancelled:
+            self.stats["timed_out"] += 1
+            raise ExtractionTimeout(f"Extraction did not finish within {timeout} seconds")
+        except ExtractionTimeout:
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            self.stats["cancelled"] += 1
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+            self.pending -= 1
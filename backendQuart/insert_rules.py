@@ -1,11 +1,12 @@
 import asyncio
+import os
 import motor.motor_asyncio
 from datetime import datetime
 
-# MongoDB connection
-client = motor.motor_asyncio.AsyncIOMotorClient('mongodb://localhost:27017')
-db = client.building_rules_db
-simple_building_rules = db.simple_building_rules
+# MongoDB connection, by default the database and collection app.py reads
+# its rules from on a local server
+MONGODB_URL = os.environ.get('MONGODB_URL', 'mongodb://localhost:27017')
+MONGODB_DATABASE = os.environ.get('MONGODB_DATABASE', 'Construction_Plan_Verification')
 
 # Sample building rules
 sample_rules = [
@@ -126,6 +127,8 @@ sample_rules = [
 ]
 
 async def insert_rules():
+    client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URL)
+    simple_building_rules = client[MONGODB_DATABASE].simplebuildingrules
     try:
         # Clear existing rules
         await simple_building_rules.delete_many({})
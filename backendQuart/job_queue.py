@@ -0,0 +1,312 @@
+import asyncio
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {
+    "high": 0,
+    "normal": 1,
+    "low": 2
+}
+
+JOB_STATES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+
+
+class JobQueueFull(Exception):
+    """Raised when no more jobs can be queued"""
+
+
+def parse_priority(value):
+    """Accept 'high' / 'normal' / 'low' or an integer (lower runs first)"""
+    if value is None or value == '':
+        return PRIORITIES["normal"]
+    if str(value).lower() in PRIORITIES:
+        return PRIORITIES[str(value).lower()]
+    return int(value)
+
+
+class JobStore:
+    """
+    SQLite-backed store of verification job state and results. Uses a single
+    connection guarded by a lock; call it through asyncio.to_thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    filename TEXT,
+                    params TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT
+                )
+            """)
+            # Stores created before jobs had owners
+            columns = {row["name"] for row in self.db.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                self.db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self.db.execute("CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)")
+            # Queues sharing the store, with the last time each renewed its lease
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS job_owners (
+                    owner TEXT PRIMARY KEY,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+
+    def create(self, job_id, priority, filename, params, owner=None):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO jobs (id, state, priority, filename, params, created_at, owner) VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, priority, filename, json.dumps(params, default=str), time.time(), owner)
+            )
+
+    def mark_running(self, job_id):
+        """Move a queued job to running; False if it was cancelled meanwhile"""
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "UPDATE jobs SET state = 'running', started_at = ? WHERE id = ? AND state = 'queued'",
+                (time.time(), job_id)
+            )
+            return cursor.rowcount == 1
+
+    def finish(self, job_id, result=None, error=None):
+        state = 'failed' if error else 'succeeded'
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (state, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id)
+            )
+
+    def cancel(self, job_id):
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "UPDATE jobs SET state = 'cancelled', finished_at = ? WHERE id = ? AND state = 'queued'",
+                (time.time(), job_id)
+            )
+            return cursor.rowcount == 1
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row["id"],
+            "state": row["state"],
+            "priority": row["priority"],
+            "filename": row["filename"],
+            "params": json.loads(row["params"]) if row["params"] else None,
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"]
+        }
+        if row["error"]:
+            job["error"] = row["error"]
+        if row["result"]:
+            job["result"] = json.loads(row["result"])
+        return job
+
+    def heartbeat(self, owner):
+        """Renew the lease of a live queue on the jobs it owns"""
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO job_owners (owner, heartbeat_at) VALUES (?, ?) "
+                "ON CONFLICT (owner) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (owner, time.time())
+            )
+
+    def release(self, owner):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM job_owners WHERE owner = ?", (owner,))
+
+    def interrupt_orphaned(self, stale_before):
+        """
+        Fail the jobs queued or running in queues whose lease was last renewed
+        before `stale_before` (or that never had one): their server stopped,
+        and the jobs cannot be resumed since uploads lived in its memory. Jobs
+        of live queues, in this process or another, are left alone.
+        """
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM job_owners WHERE heartbeat_at < ?", (stale_before,))
+            cursor = self.db.execute(
+                "UPDATE jobs SET state = 'failed', error = 'Interrupted by server restart', finished_at = ? "
+                "WHERE state IN ('queued', 'running') "
+                "AND (owner IS NULL OR owner NOT IN (SELECT owner FROM job_owners))",
+                (time.time(),)
+            )
+            return cursor.rowcount
+
+    def purge(self, older_than):
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (older_than,)
+            )
+            return cursor.rowcount
+
+    def counts(self):
+        with self.lock:
+            rows = self.db.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        return {row["state"]: row["n"] for row in rows}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class JobQueue:
+    """
+    Bounded priority queue of verification jobs processed by `workers`
+    consumer tasks. `handler(payload)` is a coroutine returning the job
+    result; payloads (the uploaded PDF and parsed fields) stay in memory while
+    job state and results go to a JobStore at `store_path`, opened by start().
+    `cleanup(payload)`, if given, runs once every job is done with, including
+    jobs cancelled before they started. Finished jobs are kept for
+    `retention` seconds.
+
+    Several queues (server processes) can share a store. Each owns the jobs
+    it created and renews a lease on them every `lease / 3` seconds; jobs
+    left unfinished by a queue whose lease ran out are marked failed.
+    """
+
+    def __init__(self, store_path, handler, workers=2, max_queued=32, retention=3600, cleanup=None, lease=60):
+        self.store_path = store_path
+        self.store = None
+        self.handler = handler
+        self.cleanup = cleanup
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self.queue = asyncio.PriorityQueue()
+        # Payloads of the jobs waiting in this queue; a cancelled job leaves
+        # it at once, so it no longer counts against max_queued
+        self.pending = {}
+        self.sequence = itertools.count()
+        self.tasks = []
+
+    async def submit(self, payload, filename, params, priority=PRIORITIES["normal"]):
+        if len(self.pending) >= self.max_queued:
+            raise JobQueueFull(f"Job queue is full ({self.max_queued} jobs waiting), try again later")
+        job_id = uuid.uuid4().hex
+        self.pending[job_id] = payload
+        try:
+            await asyncio.to_thread(self.store.create, job_id, priority, filename, params, self.owner)
+        except BaseException:
+            del self.pending[job_id]
+            raise
+        # The sequence number keeps FIFO order within a priority
+        self.queue.put_nowait((priority, next(self.sequence), job_id))
+        return job_id
+
+    async def get(self, job_id):
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None and job["state"] == 'queued':
+            job["queue_position"] = self.position(job_id)
+        return job
+
+    async def cancel(self, job_id):
+        if not await asyncio.to_thread(self.store.cancel, job_id):
+            return False
+        # Free the slot and the upload now rather than when the job is
+        # dequeued; a job queued by another process is skipped by its worker
+        payload = self.pending.pop(job_id, None)
+        if payload is not None and self.cleanup is not None:
+            self.cleanup(payload)
+        return True
+
+    def position(self, job_id):
+        ordered = sorted(item for item in self.queue._queue if item[2] in self.pending)
+        for position, (_, _, queued_id) in enumerate(ordered, start=1):
+            if queued_id == job_id:
+                return position
+        return None
+
+    async def worker(self):
+        while True:
+            _, _, job_id = await self.queue.get()
+            payload = self.pending.pop(job_id, None)
+            try:
+                if payload is None or not await asyncio.to_thread(self.store.mark_running, job_id):
+                    continue
+                try:
+                    result = await self.handler(payload)
+                    await asyncio.to_thread(self.store.finish, job_id, result)
+                except asyncio.CancelledError:
+                    await asyncio.to_thread(self.store.finish, job_id, None, "Cancelled by server shutdown")
+                    raise
+                except Exception as e:
+                    logger.error(f"Verification job {job_id} failed: {str(e)}")
+                    await asyncio.to_thread(self.store.finish, job_id, None, str(e))
+            finally:
+                if payload is not None and self.cleanup is not None:
+                    self.cleanup(payload)
+                self.queue.task_done()
+
+    async def renew_lease(self):
+        """Keep this queue's jobs owned, and fail those of queues whose lease ran out"""
+        while True:
+            await asyncio.to_thread(self.store.heartbeat, self.owner)
+            interrupted = await asyncio.to_thread(self.store.interrupt_orphaned, time.time() - self.lease)
+            if interrupted:
+                logger.warning(f"Marked {interrupted} unfinished verification jobs of stopped servers as failed")
+            await asyncio.sleep(self.lease / 3)
+
+    async def purge_expired(self):
+        while True:
+            purged = await asyncio.to_thread(self.store.purge, time.time() - self.retention)
+            if purged:
+                logger.info(f"Purged {purged} expired verification jobs")
+            await asyncio.sleep(min(self.retention, 300))
+
+    async def start(self):
+        if self.store is None:
+            self.store = JobStore(self.store_path)
+        self.tasks = [asyncio.ensure_future(self.worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.ensure_future(self.renew_lease()))
+        self.tasks.append(asyncio.ensure_future(self.purge_expired()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.store is not None:
+            # Jobs still queued here are lost with their uploads; give up the
+            # lease so the next check fails them instead of waiting it out
+            await asyncio.to_thread(self.store.release, self.owner)
+            for payload in self.pending.values():
+                if self.cleanup is not None:
+                    self.cleanup(payload)
+            self.pending.clear()
+            self.store.close()
+            self.store = None
+
+    async def info(self):
+        return {
+            "workers": self.workers,
+            "queued": len(self.pending),
+            "max_queued": self.max_queued,
+            "retention": self.retention,
+            "lease": self.lease,
+            "states": await asyncio.to_thread(self.store.counts)
+        }
@@ -0,0 +1,343 @@
+"""
+Load generator for POST /verify-pdf.
+
+Uploads the plans of a corpus (MAP/ by default) at a target rate with many
+requests in flight and reports latency percentiles, throughput and error
+rate as JSON, so runs can be compared between releases:
+
+    MONGODB_URL=memory:// hypercorn app:app --bind 127.0.0.1:5000
+    python loadtest.py --url http://127.0.0.1:5000 --rps 4 --duration 60 --output before.json
+    python loadtest.py --url http://127.0.0.1:5000 --rps 4 --duration 60 --compare before.json
+
+Without --url the app is served in-process with the in-memory database
+stand-in (MONGODB_URL=memory://). Requests are started on a fixed schedule
+whether or not earlier ones have finished (open loop), and latency is
+measured from the scheduled start, so a server falling behind shows up as
+latency rather than as a lower request rate.
+"""
+import argparse
+import asyncio
+import glob
+import http.client
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from insert_rules import sample_rules
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = [os.path.join(REPO_ROOT, 'MAP')]
+PLAN_PATTERNS = ('*.pdf', '*.jpg', '*.jpeg', '*.png')
+
+# 1 inch on paper = 8 feet, for the sample rules' city (as benchmark.py)
+FORM_FIELDS = {
+    'city': sample_rules[0]['cityName'],
+    'pincode': sample_rules[0]['pincode'],
+    'scale_value': '1',
+    'scale_unit': 'inch',
+    'scale_equals': '8',
+    'scale_equals_unit': 'feet'
+}
+
+# Relative change of a metric against the baseline reported as a regression
+DEFAULT_THRESHOLD = 0.2
+
+
+def load_corpus(directories):
+    """[(filename, bytes)] of the plans in the given directories"""
+    documents = []
+    for directory in directories:
+        for pattern in PLAN_PATTERNS:
+            for path in sorted(glob.glob(os.path.join(directory, pattern))):
+                with open(path, 'rb') as f:
+                    documents.append((os.path.basename(path), f.read()))
+    return documents
+
+
+def make_distinct(filename, data, number):
+    """
+    A PDF with a comment appended so its hash, and so its result cache key,
+    differs from every other request's. Unchanged pages are still reused
+    from the page cache; images are sent as they are.
+    """
+    if not filename.lower().endswith('.pdf'):
+        return data
+    return data + f"\n% loadtest {number}\n".encode()
+
+
+def multipart_body(fields, filename, data):
+    """(body, content type) of a multipart/form-data upload of one file plus form fields"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode()
+    )
+    parts.append(data)
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class HTTPTarget:
+    """Sends uploads to a running server, one connection per request, from a thread pool"""
+
+    def __init__(self, url, path, concurrency, timeout):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.path = parts.path.rstrip('/') + path
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _post(self, filename, data):
+        body, content_type = multipart_body(FORM_FIELDS, filename, data)
+        connection = self.connection_class(self.netloc, timeout=self.timeout)
+        try:
+            connection.request('POST', self.path, body=body, headers={'Content-Type': content_type})
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    async def send(self, filename, data):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._post, filename, data)
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class InProcessTarget:
+    """Sends uploads to the app in this process through Quart's test client"""
+
+    def __init__(self, path):
+        os.environ.setdefault('MONGODB_URL', 'memory://')
+        import app as verification_app
+        from quart.datastructures import FileStorage
+        self.app = verification_app.app
+        self.file_storage = FileStorage
+        self.path = path
+        self.context = None
+        self.client = None
+
+    async def start(self):
+        self.context = self.app.test_app()
+        test_app = await self.context.__aenter__()
+        self.client = test_app.test_client()
+
+    async def send(self, filename, data):
+        response = await self.client.post(
+            self.path, form=FORM_FIELDS, files={'file': self.file_storage(io.BytesIO(data), filename=filename)}
+        )
+        await response.get_data()
+        return response.status_code
+
+    async def close(self):
+        await self.context.__aexit__(None, None, None)
+
+
+async def run_load(target, documents, rate, total, concurrency, distinct=False):
+    """
+    Start `total` requests at `rate` per second, cycling through the
+    documents, with at most `concurrency` in flight. Returns (per-request
+    records, elapsed seconds).
+    """
+    in_flight = asyncio.Semaphore(concurrency)
+    records = []
+    started = time.perf_counter()
+
+    async def request(number, scheduled):
+        filename, data = documents[number % len(documents)]
+        if distinct:
+            data = make_distinct(filename, data, number)
+        record = {"file": filename, "status": None, "error": None}
+        async with in_flight:
+            try:
+                record["status"] = await target.send(filename, data)
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {str(e)}"
+        record["latency"] = time.perf_counter() - scheduled
+        records.append(record)
+
+    tasks = []
+    for number in range(total):
+        scheduled = started + number / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(request(number, scheduled)))
+    await asyncio.gather(*tasks)
+    return records, time.perf_counter() - started
+
+
+def summarize(records, elapsed):
+    """Latency percentiles (of successful requests), throughput and error rate of a run"""
+    succeeded = [record for record in records if record["status"] is not None and 200 <= record["status"] < 300]
+    statuses = {}
+    for record in records:
+        key = str(record["status"]) if record["status"] is not None else "exception"
+        statuses[key] = statuses.get(key, 0) + 1
+    latencies = np.array([record["latency"] for record in succeeded]) * 1000
+    latency = None
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        latency = {
+            "p50": round(float(p50), 1),
+            "p95": round(float(p95), 1),
+            "p99": round(float(p99), 1),
+            "mean": round(float(latencies.mean()), 1),
+            "max": round(float(latencies.max()), 1)
+        }
+    errors = len(records) - len(succeeded)
+    return {
+        "requests": len(records),
+        "succeeded": len(succeeded),
+        "errors": errors,
+        "error_rate": round(errors / len(records), 4) if records else None,
+        "statuses": statuses,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(succeeded) / elapsed, 3) if elapsed else None,
+        "latency_ms": latency,
+        "error_samples": sorted({record["error"] for record in records if record["error"]})[:5]
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(meta, totals, baseline, threshold):
+    """
+    Print each metric against a previous run made with the same settings;
+    returns the metrics that regressed by more than `threshold`.
+    """
+    previous = baseline["totals"]
+    for setting in ("target_rps", "concurrency", "path", "distinct"):
+        if baseline["meta"].get(setting) != meta.get(setting):
+            print(f"Warning: {setting} was {baseline['meta'].get(setting)} in the baseline run, "
+                  f"now {meta.get(setting)}", file=sys.stderr)
+    rows = [("throughput_rps", previous.get("throughput_rps"), totals.get("throughput_rps"), -1)]
+    for name in ("p50", "p95", "p99"):
+        rows.append((
+            f"latency {name} ms",
+            (previous.get("latency_ms") or {}).get(name),
+            (totals.get("latency_ms") or {}).get(name),
+            1
+        ))
+    regressions = []
+    print(f"{'metric':18} {'before':>10} {'after':>10} {'change':>8}")
+    for name, before, after, worse in rows:
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change * worse > threshold:
+            regressions.append(name)
+            flag = "  regression"
+        print(f"{name:18} {before:10.1f} {after:10.1f} {change:+8.1%}{flag}")
+    before, after = previous.get("error_rate") or 0.0, totals.get("error_rate") or 0.0
+    flag = ""
+    if after > before:
+        regressions.append("error_rate")
+        flag = "  regression"
+    print(f"{'error rate':18} {before:10.2%} {after:10.2%} {'':>8}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test POST /verify-pdf with the plans of a corpus")
+    parser.add_argument("--url", help="base URL of a running server (default: serve the app in-process)")
+    parser.add_argument("--path", default="/verify-pdf", help="endpoint to upload to, e.g. '/verify-pdf?format=columnar'")
+    parser.add_argument("--rps", type=float, default=2.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send requests for")
+    parser.add_argument("--requests", type=int, help="number of requests to send (overrides --duration)")
+    parser.add_argument("--concurrency", type=int, default=32, help="most requests in flight at once")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds before a request counts as failed")
+    parser.add_argument("--corpus", nargs="*", default=DEFAULT_CORPUS, help="directories of plans to upload")
+    parser.add_argument("--distinct", action="store_true", help="make every PDF unique so the result cache is missed")
+    parser.add_argument("--output", help="write the JSON report to this file (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative change counted as a regression by --compare (exit status 1)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    documents = load_corpus(args.corpus)
+    if not documents:
+        parser.error(f"no plans found in {', '.join(args.corpus)}")
+    total = args.requests or max(1, round(args.rps * args.duration))
+
+    if args.url:
+        target = HTTPTarget(args.url, args.path, args.concurrency, args.timeout)
+    else:
+        target = InProcessTarget(args.path)
+
+    async def run():
+        if isinstance(target, InProcessTarget):
+            await target.start()
+        try:
+            return await run_load(target, documents, args.rps, total, args.concurrency, args.distinct)
+        finally:
+            await target.close()
+
+    print(f"Sending {total} requests at {args.rps} requests/s to {args.url or 'the in-process app'}", file=sys.stderr)
+    records, elapsed = asyncio.run(run())
+    totals = summarize(records, elapsed)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.url or "in-process",
+            "path": args.path,
+            "target_rps": args.rps,
+            "concurrency": args.concurrency,
+            "distinct": args.distinct,
+            "corpus": [filename for filename, _ in documents]
+        },
+        "totals": totals
+    }
+
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+
+    latency = totals["latency_ms"] or {}
+    print(f"{totals['succeeded']}/{totals['requests']} succeeded, {totals['throughput_rps']} requests/s, "
+          f"p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, p99 {latency.get('p99')} ms, "
+          f"error rate {totals['error_rate']:.2%}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report["meta"], totals, json.load(f), args.threshold)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
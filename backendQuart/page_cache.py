@@ -0,0 +1,194 @@
+import hashlib
+import re
+
+import numpy as np
+
+from plan_extractor import open_pdf
+
+# Indirect reference inside a PDF object's source, e.g. "12 0 R"
+REFERENCE = re.compile(r"(\d+) (\d+) R")
+
+# Rooms of the same type overlapping at least this much are the same room
+MATCH_IOU = 0.5
+
+
+def object_digest(doc, xref, memo, visiting):
+    """
+    Digest of a PDF object and everything it references. References are
+    replaced by the digest of their target, so the digest depends on content
+    only and not on object numbers, which change whenever a file is re-saved.
+    """
+    if xref in memo:
+        return memo[xref]
+    if xref in visiting:
+        # Reference back up the graph (e.g. a parent link)
+        return "cycle"
+    visiting.add(xref)
+    source = doc.xref_object(xref, compressed=True)
+    digest = hashlib.sha256(resolve_references(doc, source, memo, visiting).encode())
+    if doc.xref_is_stream(xref):
+        digest.update(doc.xref_stream_raw(xref) or b"")
+    visiting.discard(xref)
+    memo[xref] = digest.hexdigest()
+    return memo[xref]
+
+
+def resolve_references(doc, source, memo, visiting):
+    return REFERENCE.sub(lambda match: object_digest(doc, int(match.group(1)), memo, visiting), source)
+
+
+def inherited_key(doc, xref, key):
+    """(type, value) of a page attribute, looking it up the page tree when it is inherited"""
+    seen = set()
+    while xref and xref not in seen:
+        seen.add(xref)
+        kind, value = doc.xref_get_key(xref, key)
+        if kind != "null":
+            return kind, value
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        xref = int(parent.split()[0]) if kind == "xref" else None
+    return "null", "null"
+
+
+def page_digest(doc, page, memo):
+    """
+    Digest of what extraction reads from a page: its content streams, its
+    resources (fonts, form XObjects with their own drawings, ...) and its
+    geometry. Annotations, thumbnails and the page's place in the document
+    are left out.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{tuple(page.mediabox)}{tuple(page.cropbox)}{page.rotation}".encode())
+    for key in ("Contents", "Resources"):
+        kind, value = inherited_key(doc, page.xref, key)
+        digest.update(f"/{key} {kind} ".encode())
+        digest.update(resolve_references(doc, value, memo, set()).encode())
+    return digest.hexdigest()
+
+
+def hash_pdf_pages(pdf_source):
+    """Content digest of every page of a PDF given as bytes or as a file path"""
+    doc = open_pdf(pdf_source)
+    try:
+        # Shared resources (fonts, logos) are hashed once per document
+        memo = {}
+        return [page_digest(doc, page, memo) for page in doc]
+    finally:
+        doc.close()
+
+
+def split_pages(shapes_data, page_numbers):
+    """Shapes of each of the given 0-based pages, in drawing order"""
+    pages = {page_num: [] for page_num in page_numbers}
+    for shape in shapes_data:
+        pages[shape["page"] - 1].append(shape)
+    return pages
+
+
+def renumber(shapes_data, page_num):
+    """Copies of a cached page's shapes with the page number of the current document"""
+    return [dict(shape, page=page_num + 1) for shape in shapes_data]
+
+
+def room_summary(shape):
+    dims = shape["real_dimensions"]
+    return {
+        "room_type": shape["color"],
+        "coordinates": shape["coordinates"],
+        "width": dims["width"],
+        "height": dims["height"],
+        "area": dims["area"],
+        "unit": dims["unit"]
+    }
+
+
+def match_rooms(previous, current):
+    """
+    Pair rooms of two versions of a page: identical boxes first, then rooms
+    of the same type by largest overlap (at least MATCH_IOU). Returns
+    (pairs, unmatched previous indices, unmatched current indices).
+    """
+    def boxes(shapes):
+        return np.array(
+            [[s["coordinates"][k] for k in ("x0", "y0", "x1", "y1")] for s in shapes], dtype=np.float64
+        ).reshape(-1, 4)
+
+    old_boxes, new_boxes = boxes(previous), boxes(current)
+    x0 = np.maximum(old_boxes[:, None, 0], new_boxes[None, :, 0])
+    y0 = np.maximum(old_boxes[:, None, 1], new_boxes[None, :, 1])
+    x1 = np.minimum(old_boxes[:, None, 2], new_boxes[None, :, 2])
+    y1 = np.minimum(old_boxes[:, None, 3], new_boxes[None, :, 3])
+    overlap = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    old_area = (old_boxes[:, 2] - old_boxes[:, 0]) * (old_boxes[:, 3] - old_boxes[:, 1])
+    new_area = (new_boxes[:, 2] - new_boxes[:, 0]) * (new_boxes[:, 3] - new_boxes[:, 1])
+    union = old_area[:, None] + new_area[None, :] - overlap
+    iou = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+    same_type = np.array([[a["color"] == b["color"] for b in current] for a in previous], dtype=bool).reshape(iou.shape)
+    identical = same_type & (np.abs(old_boxes[:, None, :] - new_boxes[None, :, :]).max(axis=2, initial=0) == 0)
+    # Identical boxes rank above any overlap
+    score = np.where(identical, 2.0, np.where(same_type & (iou >= MATCH_IOU), iou, -1.0))
+
+    pairs = []
+    old_left, new_left = set(range(len(previous))), set(range(len(current)))
+    for flat in np.argsort(-score, axis=None, kind="stable"):
+        i, j = divmod(int(flat), len(current))
+        if score[i, j] < 0:
+            break
+        if i in old_left and j in new_left:
+            pairs.append((i, j))
+            old_left.discard(i)
+            new_left.discard(j)
+    return pairs, sorted(old_left), sorted(new_left)
+
+
+def diff_page(previous, current):
+    """Rooms added, removed, resized and moved between two versions of a page"""
+    pairs, removed, added = match_rooms(previous, current)
+    resized, moved = [], []
+    for i, j in pairs:
+        before, after = room_summary(previous[i]), room_summary(current[j])
+        if (before["width"], before["height"]) != (after["width"], after["height"]):
+            resized.append({"before": before, "after": after})
+        elif before["coordinates"] != after["coordinates"]:
+            moved.append({"before": before, "after": after})
+    return {
+        "added": [room_summary(current[j]) for j in added],
+        "removed": [room_summary(previous[i]) for i in removed],
+        "resized": resized,
+        "moved": moved
+    }
+
+
+def diff_submissions(previous, current):
+    """
+    Per-page differences between two verification results (each with
+    "shapes" and "page_hashes"). Pages are compared by position; pages whose
+    content digest did not change are reported as unchanged without looking
+    at their rooms.
+    """
+    old_hashes, new_hashes = previous["page_hashes"], current["page_hashes"]
+    old_pages = split_pages(previous["shapes"], range(len(old_hashes)))
+    new_pages = split_pages(current["shapes"], range(len(new_hashes)))
+    pages = []
+    summary = {
+        "pages_unchanged": 0, "pages_changed": 0, "pages_added": 0, "pages_removed": 0,
+        "rooms_added": 0, "rooms_removed": 0, "rooms_resized": 0, "rooms_moved": 0
+    }
+    for page_num in range(max(len(old_hashes), len(new_hashes))):
+        if page_num >= len(old_hashes):
+            status = "added"
+            changes = diff_page([], new_pages[page_num])
+        elif page_num >= len(new_hashes):
+            status = "removed"
+            changes = diff_page(old_pages[page_num], [])
+        elif old_hashes[page_num] == new_hashes[page_num]:
+            summary["pages_unchanged"] += 1
+            continue
+        else:
+            status = "changed"
+            changes = diff_page(old_pages[page_num], new_pages[page_num])
+        summary[f"pages_{status}"] += 1
+        for kind in ("added", "removed", "resized", "moved"):
+            summary[f"rooms_{kind}"] += len(changes[kind])
+        pages.append({"page": page_num + 1, "status": status, **changes})
+    return {"pages": pages, "summary": summary}
@@ -0,0 +1,168 @@
+import gc
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from color_classifier import default_classifier, get_color_name
+from metrics import add_timing
+from raster_extractor import is_scanned_page, raster_regions
+
+
+def open_pdf(pdf_source):
+    """Open a PDF from a file path or from the raw bytes of an upload"""
+    if isinstance(pdf_source, (bytes, bytearray)):
+        return fitz.open(stream=pdf_source, filetype="pdf")
+    return fitz.open(pdf_source)
+
+
+def image_to_pdf(image_source):
+    """
+    PDF bytes of a one-page document showing a JPEG, PNG or TIFF image given
+    as bytes or as a file path. The page size follows the resolution stored
+    in the image (96 DPI when it has none); JPEG data is embedded as is.
+    """
+    if isinstance(image_source, (bytes, bytearray)):
+        image = fitz.open(stream=image_source)
+    else:
+        image = fitz.open(image_source)
+    try:
+        return image.convert_to_pdf()
+    finally:
+        image.close()
+
+
+def release_document_cache():
+    """Empty MuPDF's cache of decoded fonts, images and other document resources"""
+    fitz.TOOLS.store_shrink(100)
+    gc.collect()
+
+
+def is_black_color(rgb):
+    # Check if the color is black or very close to black
+    # Using a small threshold to account for minor variations
+    threshold = 0.1
+    return all(c <= threshold for c in rgb)
+
+
+def page_regions(drawings, classifier=default_classifier, timings=None):
+    """Filled, non-black drawings of a page in drawing order, classified by fill colour"""
+    regions = []
+    for shape in drawings:
+        bbox = shape.get("rect")
+        fill_color = shape.get("fill")
+        if not bbox or not fill_color or is_black_color(fill_color):
+            continue
+        started = time.perf_counter()
+        # Map color to room type (nearest palette colour), else to its colour name
+        room_type = classifier.room_type(fill_color)
+        color = room_type or get_color_name(tuple(fill_color))
+        add_timing(timings, "classify", started)
+        regions.append({
+            "id": len(regions),
+            "bbox": [bbox.x0, bbox.y0, bbox.x1, bbox.y1],
+            "rgb": tuple(fill_color),
+            "room_type": room_type,
+            "color": color,
+            "labels": []
+        })
+    return regions
+
+
+def page_labels(page):
+    """Text lines of a page with their bounding boxes"""
+    labels = []
+    text = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)
+    for block in text["blocks"]:
+        for line in block.get("lines", []):
+            content = "".join(span["text"] for span in line["spans"]).strip()
+            if content:
+                labels.append({
+                    "id": len(labels),
+                    "text": content,
+                    "bbox": list(line["bbox"]),
+                    "region": None
+                })
+    return labels
+
+
+def attach_labels(regions, labels):
+    """
+    Attach each label to the smallest region containing the centre of its box,
+    so a room name inside a room goes to the room rather than to the plot
+    outline around it.
+    """
+    if not regions or not labels:
+        return
+    boxes = np.array([region["bbox"] for region in regions], dtype=np.float64)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    centres = np.array([label["bbox"] for label in labels], dtype=np.float64)
+    cx = (centres[:, 0] + centres[:, 2]) / 2
+    cy = (centres[:, 1] + centres[:, 3]) / 2
+
+    # labels x regions containment matrix
+    inside = ((boxes[:, 0] <= cx[:, None]) & (cx[:, None] <= boxes[:, 2])
+              & (boxes[:, 1] <= cy[:, None]) & (cy[:, None] <= boxes[:, 3]))
+    candidate_areas = np.where(inside, areas, np.inf)
+    best = candidate_areas.argmin(axis=1)
+    for label, region_index, found in zip(labels, best.tolist(), inside.any(axis=1).tolist()):
+        if found:
+            label["region"] = region_index
+            regions[region_index]["labels"].append(label["id"])
+
+
+def extract_page_model(page, page_num, classifier=default_classifier, timings=None, raster=None):
+    """
+    Room model of one page from a single PyMuPDF pass: coloured regions,
+    text labels and which region each label belongs to. Coordinates are PDF
+    points with the origin at the top left of the page, as PyMuPDF gives them.
+    When `raster` is given (keyword arguments of raster_regions), the
+    regions of a scanned page (see is_scanned_page) come from its pixels
+    instead of its vector fills; the two are never combined on one page.
+    """
+    started = time.perf_counter()
+    drawings = page.get_drawings()
+    started = add_timing(timings, "drawings", started)
+    labels = page_labels(page)
+    add_timing(timings, "text", started)
+
+    regions = page_regions(drawings, classifier, timings)
+    if raster is not None and is_scanned_page(page, drawings, regions):
+        regions = raster_regions(page, classifier, timings=timings, **raster)
+    attach_labels(regions, labels)
+    return {
+        "page": page_num + 1,
+        "width": page.rect.width,
+        "height": page.rect.height,
+        "regions": regions,
+        "labels": labels
+    }
+
+
+def extract_plan(pdf_source, classifier=default_classifier, page_numbers=None):
+    """
+    Combined room model of a PDF (all pages by default). Besides the per-page
+    regions and labels, "rooms" lists every region classified as a room with
+    the text of its labels.
+    """
+    doc = open_pdf(pdf_source)
+    try:
+        if page_numbers is None:
+            page_numbers = range(len(doc))
+        pages = [extract_page_model(doc[page_num], page_num, classifier) for page_num in page_numbers]
+    finally:
+        doc.close()
+
+    rooms = []
+    for page in pages:
+        for region in page["regions"]:
+            if region["room_type"] is None:
+                continue
+            rooms.append({
+                "page": page["page"],
+                "region": region["id"],
+                "room_type": region["room_type"],
+                "bbox": region["bbox"],
+                "labels": [page["labels"][label_id]["text"] for label_id in region["labels"]]
+            })
+    return {"pages": pages, "rooms": rooms}
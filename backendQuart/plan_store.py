@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+
+import numpy as np
+from bson import Binary
+from pymongo import ASCENDING
+
+from compliance import REASON_COMPLIANT, REASON_NO_RULE, evaluate_compliance, room_graph
+from response_format import enumerate_values
+from storage import Update, bulk_update
+
+logger = logging.getLogger(__name__)
+
+# Per-room arrays of a stored plan and their little-endian dtypes
+GEOMETRY_ARRAYS = (
+    ("page", "<i4"),
+    ("room_type", "<i4"),
+    ("width", "<f8"),
+    ("height", "<f8"),
+    ("area", "<f8")
+)
+# Room graph: pairs of room indices sharing a wall, and one exterior flag per room
+EDGES_DTYPE = "<i4"
+EXTERIOR_DTYPE = "<i1"
+# One REASON_* code (see compliance.py) per room
+REASONS_DTYPE = "<i1"
+
+
+def make_plan_id(pdf_hash, scale_info, residential_type, city, pincode):
+    """
+    Identity of a stored plan: the same PDF at the same scale for the same
+    location. Unlike the result cache key it leaves the rules version out, so
+    re-evaluating a plan updates it in place.
+    """
+    payload = json.dumps({
+        "pdf": pdf_hash,
+        "scale": scale_info,
+        "residentialType": residential_type,
+        "city": city,
+        "pincode": pincode
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def pack(values, dtype):
+    return Binary(np.asarray(values, dtype=dtype).tobytes())
+
+
+def unpack(data, dtype):
+    return np.frombuffer(data, dtype=dtype)
+
+
+def compact_geometry(shapes_data, unit):
+    """
+    Room geometry of a plan as compliance needs it: room types as a table
+    plus one code per room, the real width, height and area of every room
+    and the room graph for adjacency rules, packed as binary arrays (8 bytes
+    per number instead of a BSON array element each).
+    """
+    room_types, room_type_codes = enumerate_values(shape["color"] for shape in shapes_data)
+    values = {
+        "page": [shape["page"] for shape in shapes_data],
+        "room_type": room_type_codes,
+        "width": [shape["real_dimensions"]["width"] for shape in shapes_data],
+        "height": [shape["real_dimensions"]["height"] for shape in shapes_data],
+        "area": [shape["real_dimensions"]["area"] for shape in shapes_data]
+    }
+    geometry = {
+        "count": len(shapes_data),
+        "unit": unit,
+        "room_types": room_types
+    }
+    for name, dtype in GEOMETRY_ARRAYS:
+        geometry[name] = pack(values[name], dtype)
+    edges, exterior = room_graph(shapes_data)
+    if edges is not None:
+        geometry["edges"] = pack(edges, EDGES_DTYPE)
+        geometry["exterior"] = pack(exterior, EXTERIOR_DTYPE)
+    return geometry
+
+
+def compliance_fields(reasons, rules_ver):
+    """$set fields recording the compliance of a plan's rooms under one rules version"""
+    reasons = np.asarray(reasons, dtype=REASONS_DTYPE)
+    compliant = int(np.count_nonzero((reasons == REASON_COMPLIANT) | (reasons == REASON_NO_RULE)))
+    return {
+        "rulesVersion": rules_ver,
+        "compliance": {
+            "reasons": pack(reasons, REASONS_DTYPE),
+            "summary": {
+                "compliant": compliant,
+                "non_compliant": len(reasons) - compliant,
+                "total": len(reasons)
+            }
+        },
+        "evaluatedAt": datetime.utcnow()
+    }
+
+
+def evaluate_geometries(geometries, building_rules):
+    """
+    REASON_* codes of the rooms of several stored geometries, evaluated in
+    one vectorized call over all their rooms. Returns (reasons, offsets)
+    where the rooms of geometry i are reasons[offsets[i]:offsets[i + 1]].
+    Geometries stored without a room graph are evaluated without the
+    adjacency rules.
+    """
+    with_graph = [i for i, geometry in enumerate(geometries) if "edges" in geometry]
+    if 0 < len(with_graph) < len(geometries):
+        # Evaluate both kinds separately and put the rooms back in order
+        without_graph = [i for i in range(len(geometries)) if "edges" not in geometries[i]]
+        parts = {}
+        for group in (with_graph, without_graph):
+            reasons, offsets = evaluate_geometries([geometries[i] for i in group], building_rules)
+            for position, i in enumerate(group):
+                parts[i] = reasons[offsets[position]:offsets[position + 1]]
+        ordered = [parts[i] for i in range(len(geometries))]
+        return np.concatenate(ordered), np.cumsum([0] + [len(part) for part in ordered])
+
+    room_types, units, widths, heights, areas, counts = [], [], [], [], [], []
+    edges, exterior = [], []
+    for geometry in geometries:
+        codes = unpack(geometry["room_type"], "<i4")
+        if with_graph:
+            # Room indices of this plan follow those of the plans before it
+            edges.append(unpack(geometry["edges"], EDGES_DTYPE).reshape(-1, 2) + sum(counts))
+            exterior.append(unpack(geometry["exterior"], EXTERIOR_DTYPE).astype(bool))
+        room_types.extend(np.asarray(geometry["room_types"], dtype=object)[codes].tolist())
+        units.extend([geometry["unit"]] * len(codes))
+        widths.append(unpack(geometry["width"], "<f8"))
+        heights.append(unpack(geometry["height"], "<f8"))
+        areas.append(unpack(geometry["area"], "<f8"))
+        counts.append(len(codes))
+
+    reasons = np.zeros(0, dtype=REASONS_DTYPE)
+    if room_types:
+        graph = (np.concatenate(edges), np.concatenate(exterior)) if with_graph else (None, None)
+        _, reasons, _ = evaluate_compliance(
+            room_types, np.concatenate(widths), np.concatenate(heights), np.concatenate(areas), units, building_rules,
+            *graph
+        )
+    return reasons, np.cumsum([0] + counts)
+
+
+def evaluate_plans(plans, building_rules, rules_ver):
+    """
+    Re-run compliance for a batch of stored plans. Returns (update
+    operations, rooms evaluated, plans whose compliant/non-compliant counts
+    changed).
+    """
+    reasons, offsets = evaluate_geometries([plan["geometry"] for plan in plans], building_rules)
+    operations = []
+    changed = 0
+    for plan, start, end in zip(plans, offsets[:-1], offsets[1:]):
+        fields = compliance_fields(reasons[start:end], rules_ver)
+        previous = (plan.get("compliance") or {}).get("summary")
+        if previous != fields["compliance"]["summary"]:
+            changed += 1
+        operations.append(Update({"_id": plan["_id"]}, {"$set": fields}))
+    return operations, len(reasons), changed
+
+
+class PlanStore:
+    """
+    Extracted room geometry of verified plans in MongoDB, one document per
+    plan (see make_plan_id), so plans can be checked against amended rules
+    without parsing their PDFs again. Writes made while serving a request run
+    as background tasks.
+    """
+
+    def __init__(self, collection, batch_size=1000):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.pending = set()
+
+    async def ensure_indexes(self):
+        try:
+            await self.collection.create_index(
+                [("city", ASCENDING), ("pincode", ASCENDING), ("rulesVersion", ASCENDING)]
+            )
+        except Exception as e:
+            logger.warning(f"Could not create plan geometry index: {str(e)}")
+
+    async def save(self, plan_id, city, pincode, residential_type, scale_info, pdf_hash, result, rule_set):
+        """Store the geometry and compliance of a freshly verified plan, replacing an older version"""
+        geometry = compact_geometry(result["shapes"], scale_info["equals_unit"])
+        # Shapes only carry status and message, so the reason codes are
+        # computed from the stored geometry as a re-evaluation would
+        reasons, _ = await asyncio.to_thread(evaluate_geometries, [geometry], rule_set["rules"])
+        fields = {
+            "city": city,
+            "pincode": pincode,
+            "residentialType": residential_type,
+            "scale": scale_info,
+            "pdfHash": pdf_hash,
+            "submissionId": result.get("submission_id"),
+            "geometry": geometry,
+            **compliance_fields(reasons, rule_set["version"]),
+            "updatedAt": datetime.utcnow()
+        }
+        await self.collection.update_one(
+            {"_id": plan_id},
+            {"$set": fields, "$setOnInsert": {"createdAt": datetime.utcnow()}},
+            upsert=True
+        )
+
+    def save_later(self, *args):
+        """save() in the background; failures are logged, the verification is not affected"""
+        task = asyncio.ensure_future(self._save_logged(*args))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _save_logged(self, plan_id, *args):
+        try:
+            await self.save(plan_id, *args)
+        except Exception as e:
+            logger.warning(f"Could not store plan geometry {plan_id[:12]}: {str(e)}")
+
+    async def flush(self, timeout=10):
+        """Wait up to `timeout` seconds for background saves, e.g. on shutdown"""
+        if self.pending:
+            await asyncio.wait(set(self.pending), timeout=timeout)
+
+    async def reevaluate(self, city, pincode, rule_set):
+        """
+        Check every stored plan of (city, pincode) not yet evaluated against
+        this rules version. Plans are streamed from the collection batch by
+        batch; each batch is evaluated in one call and written back with one
+        unordered bulk write. Returns counts and timings of the run.
+        """
+        started = time.perf_counter()
+        stats = {"plans": 0, "rooms": 0, "changed": 0, "batches": 0}
+        cursor = self.collection.find(
+            {"city": city, "pincode": pincode, "rulesVersion": {"$ne": rule_set["version"]}},
+            {"geometry": 1, "compliance.summary": 1}
+        ).batch_size(self.batch_size)
+
+        batch = []
+        async for plan in cursor:
+            batch.append(plan)
+            if len(batch) >= self.batch_size:
+                await self._reevaluate_batch(batch, rule_set, stats)
+                batch = []
+        if batch:
+            await self._reevaluate_batch(batch, rule_set, stats)
+
+        stats["rules_version"] = rule_set["version"]
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"Re-evaluated {stats['plans']} plans ({stats['rooms']} rooms) for {city}-{pincode} "
+                    f"in {stats['seconds']}s, {stats['changed']} changed")
+        return stats
+
+    async def _reevaluate_batch(self, plans, rule_set, stats):
+        operations, rooms, changed = await asyncio.to_thread(
+            evaluate_plans, plans, rule_set["rules"], rule_set["version"]
+        )
+        await bulk_update(self.collection, operations, ordered=False)
+        stats["plans"] += len(plans)
+        stats["rooms"] += rooms
+        stats["changed"] += changed
+        stats["batches"] += 1
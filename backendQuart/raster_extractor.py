@@ -0,0 +1,269 @@
+import math
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from color_classifier import LOOKUP_BITS, default_classifier
+from metrics import add_timing
+
+# Resolution pages are rasterized at. Room outlines need a few pixels per
+# drawn wall, not the full resolution of the scan.
+DEFAULT_DPI = 100
+# Pixels rendered at once (3 bytes each); larger pages are rendered in
+# horizontal strips. Every strip decodes the page's image again, so strips
+# are large: a whole A1 sheet at 100 DPI is one.
+DEFAULT_TILE_PIXELS = 16 * 1024 * 1024
+# Pixels classified at once within a strip; classification needs about 15
+# bytes of temporary arrays per pixel
+CHUNK_PIXELS = 1024 * 1024
+# Smallest room region kept, in square PDF points; smaller patches of a room
+# colour are scanning noise or anti-aliasing along lines
+DEFAULT_MIN_AREA = 144.0
+# Regions narrower than this many points are slivers along drawn lines
+MIN_SIDE = 4.0
+# Room fills of the plans in MAP/ and backend/files/ render about 24% washed
+# towards white, under the translucent drawing laid over them; pixels are
+# matched to palette colours mixed with up to this much white
+DEFAULT_WASH = 0.35
+# CIE76 Lab distance from the nearest washed shade. Rendered (and JPEG
+# compressed) room pixels of those plans lie a median of 1 to 1.5 from
+# theirs, while the closest washed shades of two room types (kitchen and
+# study) are 8.8 apart
+DEFAULT_COLOR_TOLERANCE = 6.0
+# Pixels this many levels of luma darker than a neighbour are walls, never
+# part of a room, so rooms separated by a thin line are not merged
+DEFAULT_EDGE_CONTRAST = 24
+# Share of the page images must cover for a page with vector fills, but none
+# of a room colour, to count as scanned; a logo or stamp on a vector plan
+# covers a few percent
+SCANNED_IMAGE_COVERAGE = 0.5
+
+
+def image_coverage(page):
+    """Share of the page area covered by its images (overlaps counted twice, capped at 1)"""
+    area = abs(page.rect)
+    if not area:
+        return 0.0
+    covered = sum(abs(fitz.Rect(image["bbox"]) & page.rect) for image in page.get_image_info())
+    return min(covered / area, 1.0)
+
+
+def is_scanned_page(page, drawings, regions):
+    """
+    A page whose rooms can only come from its pixels: no room-coloured
+    vector fill, embedded images, and either no filled drawing at all or
+    images covering most of the page. Checked cheapest first, so vector
+    plans are never rendered.
+    """
+    if any(region["room_type"] for region in regions) or not page.get_images(full=False):
+        return False
+    if not any(shape.get("fill") for shape in drawings):
+        return True
+    return image_coverage(page) >= SCANNED_IMAGE_COVERAGE
+
+
+def render_strips(page, dpi, tile_pixels):
+    """
+    Yield (top row, RGB pixels) of a page rendered at `dpi`, in horizontal
+    strips of about `tile_pixels` pixels, top to bottom. Rows are numbered
+    from the top of the page at that resolution.
+    """
+    zoom = dpi / 72
+    matrix = fitz.Matrix(zoom, zoom)
+    rect = page.rect
+    width = max(1, math.ceil(rect.width * zoom))
+    height = max(1, math.ceil(rect.height * zoom))
+    rows = max(1, tile_pixels // width)
+    for top in range(0, height, rows):
+        bottom = min(top + rows, height)
+        clip = fitz.Rect(rect.x0, rect.y0 + top / zoom, rect.x1, rect.y0 + bottom / zoom)
+        pix = page.get_pixmap(matrix=matrix, clip=clip, colorspace=fitz.csRGB, alpha=False)
+        # A view of the pixmap's samples, not a copy
+        pixels = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width * 3]
+        # MuPDF rounds the clip outwards to whole pixels; keep exactly the
+        # rows and columns of this strip
+        first = top - (pix.y - round(rect.y0 * zoom))
+        pixels = pixels.reshape(pix.height, pix.width, 3)[max(first, 0):max(first, 0) + bottom - top, :width]
+        yield top, pixels
+
+
+def wall_pixels(pixels, contrast):
+    """
+    Pixels darker, by more than `contrast` levels of luma (0-255), than one
+    of their four neighbours: drawn lines and the anti-aliased edge where a
+    room's fill meets them. A wall thinner than a pixel still leaves such a
+    pixel between the rooms on either side.
+    """
+    luma = pixels.astype(np.int16) @ np.array([77, 150, 29], dtype=np.int16) >> 8
+    lightest = luma.copy()
+    np.maximum(lightest[1:], luma[:-1], out=lightest[1:])
+    np.maximum(lightest[:-1], luma[1:], out=lightest[:-1])
+    np.maximum(lightest[:, 1:], luma[:, :-1], out=lightest[:, 1:])
+    np.maximum(lightest[:, :-1], luma[:, 1:], out=lightest[:, :-1])
+    return lightest - luma > contrast
+
+
+def strip_runs(pixels, table, bits=LOOKUP_BITS, edge_contrast=None):
+    """
+    Horizontal runs of pixels of the same palette class in one strip, as
+    arrays (row, start, end, class, colour sample), end exclusive. Runs of
+    pixels matching no palette entry, or that are walls (see wall_pixels)
+    when `edge_contrast` is given, are kept with class -1 so that the runs
+    of a row cover it completely.
+    """
+    shift = 8 - bits
+    channels = pixels >> shift
+    index = (channels[..., 0].astype(np.int32) << (2 * bits)) | (channels[..., 1].astype(np.int32) << bits) | channels[..., 2]
+    classes = table[index]
+    if edge_contrast is not None:
+        classes[wall_pixels(pixels, edge_contrast)] = -1
+    height, width = classes.shape
+
+    change = np.ones((height, width), dtype=bool)
+    change[:, 1:] = classes[:, 1:] != classes[:, :-1]
+    rows, starts = np.nonzero(change)
+    # Every row starts a run at column 0, so a run ends where the next one
+    # starts, or at the end of the row for the last run of a row
+    flat = rows * width + starts
+    ends = np.append(flat[1:], height * width) - rows * width
+    ends = np.minimum(ends, width)
+    middle = pixels[rows, (starts + ends) // 2]
+    return rows, starts, ends, classes[rows, starts], middle
+
+
+def connect_runs(rows, starts, ends, classes, width):
+    """
+    Pairs of runs of the same room class that touch vertically (overlapping
+    columns in consecutive rows). Runs are in row-major order and cover
+    every row. Each run is compared only with the runs of the next row that
+    its columns span, found by binary search.
+    """
+    keys = rows * width + starts
+    lo = np.searchsorted(keys, (rows + 1) * width + starts, side="right") - 1
+    hi = np.searchsorted(keys, (rows + 1) * width + ends, side="left")
+    last_row = rows == rows[-1] if len(rows) else rows
+    counts = np.where(last_row, 0, hi - lo)
+    first = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+    second = lo[first] + offsets
+    same = (classes[first] == classes[second]) & (classes[first] >= 0)
+    return first[same], second[same]
+
+
+def connected_components(count, first, second):
+    """
+    Component of each of `count` nodes given edges (first[i], second[i]),
+    as the smallest node index of the component. Roots are hooked onto the
+    smaller root of every edge and paths compressed by pointer jumping, all
+    as whole-array operations.
+    """
+    parent = np.arange(count)
+    while len(first):
+        a, b = parent[first], parent[second]
+        differ = a != b
+        if not differ.any():
+            break
+        first, second, a, b = first[differ], second[differ], a[differ], b[differ]
+        np.minimum.at(parent, np.maximum(a, b), np.minimum(a, b))
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+    return parent
+
+
+def enclosed(boxes, classes, sizes, candidates):
+    """
+    Candidates lying within the box of a larger candidate of the same class:
+    parts of a room cut off by furniture or fixtures drawn inside it.
+    """
+    index = np.flatnonzero(candidates)
+    b, c, n = boxes[index], classes[index], sizes[index]
+    inside = (
+        (b[:, None, 0] >= b[None, :, 0]) & (b[:, None, 1] >= b[None, :, 1])
+        & (b[:, None, 2] <= b[None, :, 2]) & (b[:, None, 3] <= b[None, :, 3])
+        & (c[:, None] == c[None, :]) & (n[:, None] < n[None, :])
+    )
+    result = np.zeros(len(boxes), dtype=bool)
+    result[index[inside.any(axis=1)]] = True
+    return result
+
+
+def raster_regions(page, classifier=default_classifier, dpi=DEFAULT_DPI, tile_pixels=DEFAULT_TILE_PIXELS,
+                   min_area=DEFAULT_MIN_AREA, tolerance=DEFAULT_COLOR_TOLERANCE, wash=DEFAULT_WASH,
+                   edge_contrast=DEFAULT_EDGE_CONTRAST, timings=None):
+    """
+    Room regions of a page from its pixels, in the format of page_regions:
+    the page is rendered strip by strip, every pixel classified against the
+    room palette through a lookup table, a chunk of rows at a time, and the
+    regions are the connected components of same-class pixels, found on
+    horizontal runs rather than single pixels. Walls (see wall_pixels)
+    separate regions unless `edge_contrast` is None. Memory is bounded by the
+    strip and chunk sizes plus the runs. Regions are ordered top to bottom,
+    left to right.
+    """
+    table, room_types = classifier.lookup_table(tolerance, wash=wash)
+    zoom = dpi / 72
+    parts = []
+    width = None
+    started = time.perf_counter()
+    for top, pixels in render_strips(page, dpi, tile_pixels):
+        started = add_timing(timings, "render", started)
+        width = pixels.shape[1]
+        chunk_rows = max(1, CHUNK_PIXELS // width)
+        for offset in range(0, len(pixels), chunk_rows):
+            rows, starts, ends, classes, middle = strip_runs(pixels[offset:offset + chunk_rows], table, edge_contrast=edge_contrast)
+            parts.append((rows + top + offset, starts, ends, classes, middle))
+        started = add_timing(timings, "raster", started)
+
+    if not parts:
+        return []
+    rows, starts, ends, classes, middle = (np.concatenate(values) for values in zip(*parts))
+    first, second = connect_runs(rows, starts, ends, classes, width)
+    component = connected_components(len(rows), first, second)
+
+    # Pixel count, bounding box and average colour of every component of
+    # room-coloured runs
+    room_runs = classes >= 0
+    roots, labels = np.unique(component[room_runs], return_inverse=True)
+    lengths = (ends - starts)[room_runs]
+    pixel_count = np.bincount(labels, weights=lengths, minlength=len(roots))
+    x0 = np.full(len(roots), np.iinfo(np.int64).max)
+    y0 = x0.copy()
+    x1 = np.zeros(len(roots), dtype=np.int64)
+    y1 = x1.copy()
+    np.minimum.at(x0, labels, starts[room_runs])
+    np.minimum.at(y0, labels, rows[room_runs])
+    np.maximum.at(x1, labels, ends[room_runs])
+    np.maximum.at(y1, labels, rows[room_runs] + 1)
+    colour = np.stack([
+        np.bincount(labels, weights=lengths * middle[room_runs, channel], minlength=len(roots))
+        for channel in range(3)
+    ], axis=1) / pixel_count[:, None] / 255
+    region_class = classes[roots]
+
+    keep = (
+        (pixel_count / (zoom * zoom) >= min_area)
+        & (np.minimum(x1 - x0, y1 - y0) / zoom >= MIN_SIDE)
+    )
+    keep &= ~enclosed(np.column_stack((x0, y0, x1, y1)), region_class, pixel_count, keep)
+    order = np.lexsort((x0, y0))
+    regions = []
+    origin_x, origin_y = page.rect.x0, page.rect.y0
+    for i in order[keep[order]].tolist():
+        room_type = room_types[region_class[i]]
+        regions.append({
+            "id": len(regions),
+            "bbox": [
+                origin_x + x0[i] / zoom, origin_y + y0[i] / zoom,
+                origin_x + x1[i] / zoom, origin_y + y1[i] / zoom
+            ],
+            "rgb": tuple(colour[i].tolist()),
+            "room_type": room_type,
+            "color": room_type,
+            "labels": []
+        })
+    add_timing(timings, "raster", started)
+    return regions
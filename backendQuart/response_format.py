@@ -0,0 +1,103 @@
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:  # optional, the standard json module is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional, only gzip is offered without it
+    brotli = None
+
+# Bottom-left origin coordinates in points and in real units, and the
+# dimensions of each shape, one array per field
+GEOMETRY_COLUMNS = (
+    ("x0", "coordinates", "x0"),
+    ("y0", "coordinates", "y0"),
+    ("x1", "coordinates", "x1"),
+    ("y1", "coordinates", "y1"),
+    ("real_x0", "real_coordinates", "x0"),
+    ("real_y0", "real_coordinates", "y0"),
+    ("real_x1", "real_coordinates", "x1"),
+    ("real_y1", "real_coordinates", "y1"),
+    ("width", "dimensions", "width"),
+    ("height", "dimensions", "height"),
+    ("real_width", "real_dimensions", "width"),
+    ("real_height", "real_dimensions", "height"),
+    ("real_area", "real_dimensions", "area")
+)
+
+
+def enumerate_values(values):
+    """(table of distinct values in order of first use, index of each value in the table)"""
+    index = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    return list(index), codes
+
+
+def columnar_shapes(shapes_data, unit):
+    """
+    Shapes as parallel arrays: shape i is element i of every array. Room
+    types, statuses and compliance messages are sent once in a table and
+    referenced by index; the preformatted area/width/length strings and
+    "space" of the full format are left out as they follow from the numbers.
+    """
+    room_types, room_type_codes = enumerate_values(shape["color"] for shape in shapes_data)
+    statuses, status_codes = enumerate_values(shape["status"] for shape in shapes_data)
+    messages, message_codes = enumerate_values(shape["message"] for shape in shapes_data)
+    columns = {
+        "count": len(shapes_data),
+        "unit": unit,
+        "room_types": room_types,
+        "statuses": statuses,
+        "messages": messages,
+        "page": [shape["page"] for shape in shapes_data],
+        "room_type": room_type_codes,
+        "status": status_codes,
+        "message": message_codes,
+        "rgb": [shape["rgb"] for shape in shapes_data]
+    }
+    for column, group, key in GEOMETRY_COLUMNS:
+        columns[column] = [shape[group][key] for shape in shapes_data]
+    columns["labels"] = [shape.get("labels", []) for shape in shapes_data]
+    columns["adjacent"] = [shape.get("adjacent", []) for shape in shapes_data]
+    columns["exterior"] = [shape.get("exterior") for shape in shapes_data]
+    return columns
+
+
+def dumps(obj):
+    """JSON bytes of obj, with orjson when it is installed. Other objects (ObjectId) become strings."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str, separators=(',', ':')).encode()
+
+
+def accepted_encodings(accept_encoding):
+    """Content codings listed in an Accept-Encoding header, minus any refused with q=0"""
+    encodings = set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if coding:
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+def compress(body, accept_encoding, min_bytes=1024):
+    """
+    (body, content coding) compressed with brotli or gzip when the client
+    accepts it and the body is at least min_bytes; the coding is None when
+    the body is returned as is.
+    """
+    if len(body) < min_bytes:
+        return body, None
+    encodings = accepted_encodings(accept_encoding or '')
+    # Fast settings: most of the gain on repetitive JSON without slowing the response
+    if brotli is not None and 'br' in encodings:
+        return brotli.compress(body, quality=4), 'br'
+    if 'gzip' in encodings or '*' in encodings:
+        return gzip.compress(body, compresslevel=1), 'gzip'
+    return body, None
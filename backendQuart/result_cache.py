@@ -0,0 +1,199 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Cache keys (and submission ids) are SHA-256 hex digests
+CACHE_KEY = re.compile(r"[0-9a-f]{64}")
+
+
+def is_cache_key(value):
+    return isinstance(value, str) and CACHE_KEY.fullmatch(value) is not None
+
+
+def hash_pdf_source(pdf_source):
+    """SHA-256 of a PDF given as bytes or as a file path"""
+    digest = hashlib.sha256()
+    if isinstance(pdf_source, (bytes, bytearray)):
+        digest.update(pdf_source)
+    else:
+        with open(pdf_source, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Fields of a building rules document its version is derived from, besides _id
+RULES_VERSION_FIELDS = ('rules', 'colors', 'adjacencyRules')
+
+
+def rules_version(building_rules):
+    """
+    Version of a building rules document. Derived from the document id, its
+    rules, its colour palette and its adjacency rules (RULES_VERSION_FIELDS)
+    so any edit changes the version, even when the writer did not touch
+    updatedAt. Documents without adjacency rules keep the version they had
+    before those existed.
+    """
+    fields = [str(building_rules.get('_id')), building_rules.get('rules', []), building_rules.get('colors')]
+    if building_rules.get('adjacencyRules'):
+        fields.append(building_rules['adjacencyRules'])
+    payload = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def make_cache_key(pdf_hash, scale_info, rules_ver, residential_type=None):
+    payload = json.dumps({
+        "pdf": pdf_hash,
+        "scale": scale_info,
+        "rules": rules_ver,
+        "residentialType": residential_type
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Two tier cache of verification results keyed by make_cache_key().
+
+    The memory tier is an LRU bounded by entry count and by the size of the
+    JSON encoded values. The optional disk tier keeps one JSON file per key
+    in disk_dir and is bounded by total bytes; entries promoted from disk are
+    put back into memory.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return json.loads(entry)
+
+        encoded = self._read_disk(key)
+        if encoded is None:
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self.lock:
+            self.stats["disk_hits"] += 1
+            self._store_memory(key, encoded)
+        return json.loads(encoded)
+
+    def set(self, key, value):
+        encoded = json.dumps(value, default=str)
+        with self.lock:
+            self.stats["stores"] += 1
+            self._store_memory(key, encoded)
+        self._write_disk(key, encoded)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def info(self):
+        with self.lock:
+            lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = lookups - self.stats["misses"]
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "disk": bool(self.disk_dir),
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                **self.stats
+            }
+
+    def _store_memory(self, key, encoded):
+        if len(encoded) > self.max_bytes:
+            return
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self.entries[key] = encoded
+        self.size += len(encoded)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def _disk_path(self, key):
+        # Keys may come from clients (previous_submission); never let one
+        # name a file outside disk_dir
+        if not is_cache_key(key):
+            raise ValueError(f"Invalid cache key {key!r}")
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                encoded = f.read()
+            # Touch the file so disk eviction is least-recently-used as well
+            os.utime(self._disk_path(key))
+            return encoded
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Could not read cached result {key}: {str(e)}")
+            return None
+
+    def _write_disk(self, key, encoded):
+        if not self.disk_dir:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.disk_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(encoded)
+            os.replace(tmp_path, self._disk_path(key))
+            self._trim_disk()
+        except OSError as e:
+            logger.warning(f"Could not write cached result {key}: {str(e)}")
+
+    def _trim_disk(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        while total > self.disk_max_bytes and files:
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+                total -= size
+                with self.lock:
+                    self.stats["evictions"] += 1
+            except OSError:
+                pass
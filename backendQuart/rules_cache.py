@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from compliance import compile_rules
+from result_cache import RULES_VERSION_FIELDS, rules_version
+
+logger = logging.getLogger(__name__)
+
+
+class RulesCache:
+    """
+    In-process cache of active building rule sets keyed by (city, pincode).
+
+    Each entry holds the rules document, its compiled room-type index and its
+    version. After `ttl` seconds an entry is revalidated with a projection on
+    the fields its version is derived from plus `updatedAt`, and only
+    refetched and recompiled when the version or `updatedAt` changed, so
+    edits are picked up whether or not the writer bumps `updatedAt`. A
+    change stream watcher, when the deployment supports it, drops entries as
+    soon as their document changes. Concurrent misses for the same key share
+    a single query.
+    """
+
+    def __init__(self, collection, ttl=60, max_entries=256):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.watch_task = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "revalidated": 0,
+            "invalidations": 0
+        }
+
+    @staticmethod
+    def query(city, pincode):
+        return {"cityName": city, "pincode": pincode, "status": "active"}
+
+    async def get(self, city, pincode):
+        """Return the cached rule set for (city, pincode), or None if there are no active rules"""
+        key = (city, pincode)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if time.monotonic() - entry["fetched_at"] < self.ttl:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            if await self._still_current(entry):
+                entry["fetched_at"] = time.monotonic()
+                self.entries.move_to_end(key)
+                self.stats["revalidated"] += 1
+                return entry
+
+        self.stats["misses"] += 1
+        if key not in self.inflight:
+            self.inflight[key] = asyncio.ensure_future(self._load(key))
+        try:
+            return await asyncio.shield(self.inflight[key])
+        finally:
+            if key in self.inflight and self.inflight[key].done():
+                del self.inflight[key]
+
+    async def _still_current(self, entry):
+        city, pincode = entry["key"]
+        projection = {field: 1 for field in (*RULES_VERSION_FIELDS, "updatedAt")}
+        current = await self.collection.find_one(self.query(city, pincode), projection)
+        return (current is not None
+                and rules_version(current) == entry["version"]
+                and current.get("updatedAt") == entry["document"].get("updatedAt"))
+
+    async def _load(self, key):
+        document = await self.collection.find_one(self.query(*key))
+        if document is None:
+            self.entries.pop(key, None)
+            return None
+        entry = {
+            "key": key,
+            "document": document,
+            "rules": compile_rules(document),
+            "version": rules_version(document),
+            "fetched_at": time.monotonic()
+        }
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    async def active_locations(self, limit=None):
+        """(city, pincode) of active rule sets in the collection, at most `limit` of them"""
+        cursor = self.collection.find({"status": "active"}, {"cityName": 1, "pincode": 1})
+        documents = await cursor.to_list(length=limit)
+        return [(document["cityName"], document["pincode"]) for document in documents]
+
+    async def refresh(self, city, pincode):
+        """Reload the rule set of (city, pincode) from the collection, bypassing the TTL"""
+        self.entries.pop((city, pincode), None)
+        return await self.get(city, pincode)
+
+    def invalidate(self, document_id=None):
+        """Drop the entry for one rules document, or everything when no id is given"""
+        if document_id is None:
+            self.entries.clear()
+        else:
+            for key in [k for k, e in self.entries.items() if e["document"]["_id"] == document_id]:
+                del self.entries[key]
+        self.stats["invalidations"] += 1
+
+    async def watch(self):
+        """Invalidate entries from the collection's change stream until cancelled"""
+        try:
+            async with self.collection.watch() as stream:
+                logger.info("Watching building rules change stream")
+                async for change in stream:
+                    document_key = change.get("documentKey") or {}
+                    self.invalidate(document_key.get("_id"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Standalone servers have no change streams; TTL revalidation still applies
+            logger.warning(f"Building rules change stream unavailable, relying on TTL: {str(e)}")
+
+    def start_watching(self):
+        if self.watch_task is None:
+            self.watch_task = asyncio.ensure_future(self.watch())
+
+    async def stop_watching(self):
+        if self.watch_task is not None:
+            self.watch_task.cancel()
+            try:
+                await self.watch_task
+            except asyncio.CancelledError:
+                pass
+            self.watch_task = None
+
+    def info(self):
+        return {
+            "entries": len(self.entries),
+            "ttl": self.ttl,
+            "watching": self.watch_task is not None and not self.watch_task.done(),
+            **self.stats
+        }
@@ -0,0 +1,106 @@
+import numpy as np
+
+# PDF point to inch conversion (1 point = 1/72 inch)
+PDF_POINT_TO_INCH = 1/72
+
+# Drawing unit -> multiplier from inches to that unit
+DRAWING_UNITS = {
+    "inch": None,
+    "cm": 2.54,
+    "mm": 25.4
+}
+
+
+class Scale:
+    """
+    Drawing scale of a request (e.g. 1 inch = 8 feet) compiled once into the
+    chain of multipliers that turns PDF points into real-world units, so a
+    page of boxes is converted with a few NumPy operations instead of parsing
+    and branching on the scale strings for every coordinate. The multipliers
+    are applied in the same order as the scalar conversion they replace, so
+    the results are the same floats.
+    """
+
+    def __init__(self, factors, dimension_factor, unit):
+        self.factors = tuple(factors)
+        # Extra multiplier for widths and heights when the drawing unit and
+        # the real unit belong to different systems (inches to meters etc.)
+        self.dimension_factor = dimension_factor
+        self.unit = unit
+
+    @classmethod
+    def from_info(cls, scale_info):
+        """
+        Compile the scale fields of a verification request. Raises ValueError
+        when the scale numbers are not numbers or the drawing value is zero.
+        """
+        unit = scale_info['unit']
+        equals_unit = scale_info['equals_unit']
+
+        factors = [PDF_POINT_TO_INCH]
+        if unit in DRAWING_UNITS:
+            if DRAWING_UNITS[unit] is not None:
+                factors.append(DRAWING_UNITS[unit])
+            try:
+                factors.append(float(scale_info['equals']) / float(scale_info['value']))
+            except ZeroDivisionError:
+                raise ValueError("Scale value must not be zero")
+        # Any other drawing unit is taken as plain inches
+
+        dimension_factor = None
+        if equals_unit == 'meters' and unit in ('inch', 'feet'):
+            dimension_factor = 0.3048
+        elif equals_unit == 'feet' and unit in ('cm', 'meters'):
+            dimension_factor = 3.28084
+        return cls(factors, dimension_factor, equals_unit)
+
+    def to_real(self, points):
+        """Array of PDF point distances in real-world units"""
+        values = np.asarray(points, dtype=np.float64)
+        for factor in self.factors:
+            values = values * factor
+        return values
+
+    def transform_boxes(self, bboxes, page_height):
+        """
+        Convert the top-left origin (x0, y0, x1, y1) boxes of one page in one
+        pass. Returns arrays of the bottom-left origin coordinates (n x 4),
+        their real-world coordinates (n x 4), the width and height in points
+        (n x 2) and the real width, height and area (n x 3).
+        """
+        boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        # Flip Y so coordinates start from the bottom-left of the page
+        coordinates = np.column_stack((
+            boxes[:, 0], page_height - boxes[:, 3], boxes[:, 2], page_height - boxes[:, 1]
+        ))
+        width = np.abs(coordinates[:, 2] - coordinates[:, 0])
+        height = np.abs(coordinates[:, 3] - coordinates[:, 1])
+
+        real_width = self.to_real(width)
+        real_height = self.to_real(height)
+        if self.dimension_factor is not None:
+            real_width = real_width * self.dimension_factor
+            real_height = real_height * self.dimension_factor
+
+        return (
+            coordinates,
+            self.to_real(coordinates),
+            np.column_stack((width, height)),
+            np.column_stack((real_width, real_height, real_width * real_height))
+        )
+
+
+def rounded(values, digits=2):
+    """
+    Rows of an array as lists of floats rounded exactly like round(). NumPy
+    rounds the scaled value, which can land on the other side of a tie than
+    round() does on the exact value, so values next to a tie (and very large
+    ones) are rounded with round() itself.
+    """
+    scaled = values * 10.0 ** digits
+    result = np.rint(scaled) / 10.0 ** digits
+    with np.errstate(invalid='ignore'):  # inf - inf for infinite values
+        near_tie = (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6) | (np.abs(scaled) >= 2.0 ** 40)
+    if near_tie.any():
+        result[near_tie] = [round(value, digits) for value in values[near_tie].tolist()]
+    return result.tolist()
@@ -0,0 +1,290 @@
+import copy
+import logging
+from collections import namedtuple
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# MONGODB_URL selecting the in-process stand-in instead of a MongoDB server
+MEMORY_URL = "memory://"
+
+
+# One update of a bulk write, for MongoDB as well as the in-memory stand-in
+Update = namedtuple("Update", ["filter", "update", "upsert"], defaults=[False])
+
+
+def is_memory_url(url):
+    return url.startswith(MEMORY_URL)
+
+
+def open_database(url, name, seed=None):
+    """
+    Database `name` at a MongoDB URL, or an in-memory stand-in when the URL
+    is memory://, filled with `seed` ({collection name: [documents]}). The
+    stand-in lives in this process only; it serves load tests and local
+    development without a MongoDB server.
+    """
+    if is_memory_url(url):
+        database = MemoryDatabase(name)
+        for collection_name, documents in (seed or {}).items():
+            database[collection_name].seed(documents)
+        logger.info(f"Using the in-memory database stand-in for {name}")
+        return database
+    import motor.motor_asyncio
+    return motor.motor_asyncio.AsyncIOMotorClient(url)[name]
+
+
+def get_path(document, path):
+    """(found, value) of a dotted field path"""
+    value = document
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return False, None
+        value = value[part]
+    return True, value
+
+
+def set_path(document, path, value):
+    *parents, last = path.split('.')
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+
+def unset_path(document, path):
+    *parents, last = path.split('.')
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(last, None)
+
+
+def is_operator_condition(condition):
+    return isinstance(condition, dict) and bool(condition) and all(key.startswith('$') for key in condition)
+
+
+def equals(value, expected):
+    # Like MongoDB, a condition on an array field matches any of its elements
+    return value == expected or (isinstance(value, list) and expected in value)
+
+
+def compare(found, value, operator, operand):
+    if operator == '$eq':
+        return found and equals(value, operand)
+    if operator == '$ne':
+        return not (found and equals(value, operand))
+    if operator == '$in':
+        return found and any(equals(value, item) for item in operand)
+    if operator == '$nin':
+        return not (found and any(equals(value, item) for item in operand))
+    if operator == '$exists':
+        return found == bool(operand)
+    if operator in ('$gt', '$gte', '$lt', '$lte'):
+        if not found or value is None:
+            return False
+        try:
+            return {
+                '$gt': value > operand, '$gte': value >= operand, '$lt': value < operand, '$lte': value <= operand
+            }[operator]
+        except TypeError:
+            return False
+    raise ValueError(f"Query operator {operator} is not supported by the in-memory store")
+
+
+def matches(document, query):
+    """Whether a document matches a query of field equalities and simple comparison operators"""
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            if not all(matches(document, part) for part in condition):
+                return False
+        elif key == '$or':
+            if not any(matches(document, part) for part in condition):
+                return False
+        elif is_operator_condition(condition):
+            found, value = get_path(document, key)
+            if not all(compare(found, value, operator, operand) for operator, operand in condition.items()):
+                return False
+        else:
+            found, value = get_path(document, key)
+            if not (found and equals(value, condition)) and not (condition is None and not found):
+                return False
+    return True
+
+
+def project(document, projection):
+    """Copy of a document restricted by an inclusion or exclusion projection"""
+    if not projection:
+        return copy.deepcopy(document)
+    projection = dict(projection)
+    include_id = projection.pop('_id', 1)
+    if any(projection.values()):
+        result = {}
+        for path in projection:
+            found, value = get_path(document, path)
+            if found:
+                set_path(result, path, copy.deepcopy(value))
+    else:
+        result = copy.deepcopy(document)
+        for path in projection:
+            unset_path(result, path)
+    if include_id and '_id' in document:
+        result['_id'] = document['_id']
+    else:
+        result.pop('_id', None)
+    return result
+
+
+class MemoryCursor:
+    """The part of a Motor cursor the application uses: batch_size, limit, to_list and async iteration"""
+
+    def __init__(self, documents, projection):
+        self.documents = documents
+        self.projection = projection
+        self.max_documents = None
+
+    def batch_size(self, size):
+        return self
+
+    def limit(self, count):
+        self.max_documents = count or None
+        return self
+
+    def _selected(self):
+        documents = self.documents if self.max_documents is None else self.documents[:self.max_documents]
+        return [project(document, self.projection) for document in documents]
+
+    async def to_list(self, length=None):
+        documents = self._selected()
+        return documents if length is None else documents[:length]
+
+    async def __aiter__(self):
+        for document in self._selected():
+            yield document
+
+
+class MemoryCollection:
+    """
+    In-memory stand-in for a Motor collection with the operations this
+    service uses. Documents are copied on the way in and out, as they would
+    be through a database.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.documents = []
+
+    def seed(self, documents):
+        for document in documents:
+            self.documents.append(dict(copy.deepcopy(document), _id=document.get('_id', ObjectId())))
+
+    def _matching(self, query):
+        return [document for document in self.documents if matches(document, query)]
+
+    async def find_one(self, query=None, projection=None):
+        for document in self.documents:
+            if matches(document, query):
+                return project(document, projection)
+        return None
+
+    def find(self, query=None, projection=None):
+        return MemoryCursor(self._matching(query), projection)
+
+    async def count_documents(self, query):
+        return len(self._matching(query))
+
+    async def insert_one(self, document):
+        self.seed([document])
+        return SimpleNamespace(inserted_id=self.documents[-1]['_id'])
+
+    async def insert_many(self, documents):
+        self.seed(documents)
+        return SimpleNamespace(inserted_ids=[document['_id'] for document in self.documents[-len(documents):]])
+
+    async def update_one(self, query, update, upsert=False):
+        return self._update_one(query, update, upsert)
+
+    def _update_one(self, query, update, upsert=False):
+        for document in self.documents:
+            if matches(document, query):
+                self._apply(document, update, inserting=False)
+                return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+        if not upsert:
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+        document = {
+            key: copy.deepcopy(value) for key, value in query.items()
+            if not key.startswith('$') and not is_operator_condition(value)
+        }
+        document.setdefault('_id', ObjectId())
+        self._apply(document, update, inserting=True)
+        self.documents.append(document)
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=document['_id'])
+
+    @staticmethod
+    def _apply(document, update, inserting):
+        for operator, fields in update.items():
+            if operator == '$set' or (operator == '$setOnInsert' and inserting):
+                for path, value in fields.items():
+                    set_path(document, path, copy.deepcopy(value))
+            elif operator == '$unset':
+                for path in fields:
+                    unset_path(document, path)
+            elif operator == '$inc':
+                for path, amount in fields.items():
+                    set_path(document, path, (get_path(document, path)[1] or 0) + amount)
+            elif operator != '$setOnInsert':
+                raise ValueError(f"Update operator {operator} is not supported by the in-memory store")
+
+    async def delete_many(self, query):
+        kept = [document for document in self.documents if not matches(document, query)]
+        deleted = len(self.documents) - len(kept)
+        self.documents = kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    async def bulk_write(self, operations, ordered=True):
+        """Apply Update operations; use bulk_update rather than calling this directly"""
+        result = SimpleNamespace(inserted_count=0, matched_count=0, modified_count=0, upserted_count=0)
+        for operation in operations:
+            if not isinstance(operation, Update):
+                raise TypeError(f"{type(operation).__name__} is not supported by the in-memory store, use storage.Update")
+            outcome = self._update_one(operation.filter, operation.update, operation.upsert)
+            result.matched_count += outcome.matched_count
+            result.modified_count += outcome.modified_count
+            result.upserted_count += outcome.upserted_id is not None
+        return result
+
+    async def create_index(self, keys, **kwargs):
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+    def watch(self, *args, **kwargs):
+        raise TypeError("The in-memory store has no change streams")
+
+
+class MemoryDatabase:
+    """Collections of the in-memory stand-in, created on first use like MongoDB's"""
+
+    def __init__(self, name):
+        self.name = name
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(name)
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+
+async def bulk_update(collection, updates, ordered=True):
+    """Apply a list of Update operations to a Motor collection or an in-memory one in one bulk write"""
+    if isinstance(collection, MemoryCollection):
+        return await collection.bulk_write(updates, ordered=ordered)
+    return await collection.bulk_write(
+        [UpdateOne(update.filter, update.update, upsert=update.upsert) for update in updates], ordered=ordered
+    )
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# The app reads its configuration at import: use the in-memory database
+# stand-in and keep job state out of the working tree
+os.environ.setdefault('MONGODB_URL', 'memory://')
+os.environ.setdefault('RULES_CHANGE_STREAM', '0')
+os.environ.setdefault('JOB_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='plan-tests-'), 'jobs.db'))
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import uuid
+
+import app as verification_app
+from conftest import REPO_ROOT
+from insert_rules import sample_rules
+
+FORM_FIELDS = {
+    'city': sample_rules[0]['cityName'],
+    'pincode': sample_rules[0]['pincode'],
+    'scale_value': '1',
+    'scale_unit': 'inch',
+    'scale_equals': '8',
+    'scale_equals_unit': 'feet'
+}
+
+
+def multipart_body(fields, files):
+    """(body, content type) of a multipart/form-data request with several 'files' parts"""
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    for filename, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'.encode() + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+async def post_batch(files):
+    body, content_type = multipart_body(FORM_FIELDS, files)
+    async with verification_app.app.test_app() as test_app:
+        response = await test_app.test_client().post(
+            '/verify-pdf/batch', data=body, headers={'Content-Type': content_type}
+        )
+        return response.status_code, await response.get_json()
+
+
+def test_batch_reports_non_pdf_as_that_files_error():
+    with open(os.path.join(REPO_ROOT, 'MAP', '2BHK.pdf'), 'rb') as f:
+        plan = f.read()
+    files = [
+        ('first.pdf', plan),
+        ('not-a-plan.pdf', b'plain text, not a PDF\n' * 300),
+        ('second.pdf', plan),
+        ('third.pdf', plan)
+    ]
+    status, body = asyncio.run(post_batch(files))
+
+    assert status == 200
+    results = {result['filename']: result for result in body['files']}
+    assert results['not-a-plan.pdf']['status'] == 'error'
+    assert 'not a PDF' in results['not-a-plan.pdf']['message']
+    for filename in ('first.pdf', 'second.pdf', 'third.pdf'):
+        assert results[filename]['status'] == 'success'
+    assert body['summary']['succeeded'] == 3
+    assert body['summary']['failed'] == 1
+
+
+def test_single_upload_still_rejected_early():
+    body, content_type = multipart_body(FORM_FIELDS, [('not-a-plan.pdf', b'plain text, not a PDF\n' * 300)])
+    body = body.replace(b'name="files"', b'name="file"')
+
+    async def post():
+        async with verification_app.app.test_app() as test_app:
+            response = await test_app.test_client().post(
+                '/verify-pdf', data=body, headers={'Content-Type': content_type}
+            )
+            return response.status_code
+
+    assert asyncio.run(post()) == 415
@@ -0,0 +1,16 @@
+import json
+import os
+
+import benchmark
+from compliance import compile_rules
+from insert_rules import sample_rules
+
+SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus_shapes.json')
+
+
+def test_corpus_shapes_unchanged():
+    """The committed plans give the shapes stored in corpus_shapes.json"""
+    with open(SNAPSHOT) as f:
+        expected = json.load(f)
+    snapshot = benchmark.corpus_snapshot(benchmark.DEFAULT_CORPUS, compile_rules(sample_rules[0]))
+    assert benchmark.check_snapshot(snapshot, expected)
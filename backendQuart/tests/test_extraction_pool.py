@@ -0,0 +1,39 @@
+import asyncio
+import multiprocessing
+import os
+
+from extraction_pool import ExtractionPool
+
+
+def worker_pid(deadline=None):
+    return os.getpid()
+
+
+def serve(results):
+    """Runs a process pool job from a daemonic process, as hypercorn's workers are"""
+    pool = ExtractionPool(mode='process', max_workers=1)
+    pool.start()
+    try:
+        pid = asyncio.run(pool.run(worker_pid))
+        results.put((pool.mode, pid != os.getpid()))
+    finally:
+        pool.shutdown()
+
+
+def test_process_pool_in_daemonic_process():
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    server = context.Process(target=serve, args=(results,), daemon=True)
+    server.start()
+    try:
+        assert results.get(timeout=60) == ('process', True)
+    finally:
+        server.join(timeout=10)
+    assert server.exitcode == 0
+
+
+def test_thread_mode_memory_limit_covers_every_worker():
+    pool = ExtractionPool(mode='thread', max_workers=4, memory_limit=1024)
+    assert pool.server_memory_limit() == 4096
+    assert ExtractionPool(mode='inline', max_workers=4, memory_limit=1024).server_memory_limit() == 1024
+    assert ExtractionPool(mode='thread', max_workers=4).server_memory_limit() is None
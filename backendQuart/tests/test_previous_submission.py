@@ -0,0 +1,45 @@
+import asyncio
+import io
+import os
+
+import pytest
+from quart.datastructures import FileStorage
+
+import app as verification_app
+from conftest import REPO_ROOT
+from result_cache import ResultCache
+from test_batch_upload import FORM_FIELDS
+
+
+async def verify(previous_submission=None):
+    form = dict(FORM_FIELDS)
+    if previous_submission is not None:
+        form['previous_submission'] = previous_submission
+    with open(os.path.join(REPO_ROOT, 'MAP', '2BHK.pdf'), 'rb') as f:
+        upload = FileStorage(io.BytesIO(f.read()), filename='plan.pdf')
+    async with verification_app.app.test_app() as test_app:
+        response = await test_app.test_client().post('/verify-pdf', form=form, files={'file': upload})
+        return response.status_code, await response.get_json()
+
+
+@pytest.mark.parametrize("previous_submission", ["../../etc/passwd", "A" * 64, "abc", "0" * 63 + "/"])
+def test_malformed_previous_submission_is_rejected(previous_submission):
+    status, body = asyncio.run(verify(previous_submission))
+    assert status == 400
+    assert "previous_submission" in body["message"]
+
+
+def test_previous_submission_is_compared():
+    status, first = asyncio.run(verify())
+    assert status == 200
+    status, second = asyncio.run(verify(first["submission_id"]))
+    assert status == 200
+    assert second["revision_diff"]["found"] is True
+
+
+def test_disk_tier_refuses_keys_outside_its_directory(tmp_path):
+    outside = tmp_path / "secret.json"
+    outside.write_text('{"secret": true}')
+    cache = ResultCache(disk_dir=str(tmp_path / "cache"))
+    with pytest.raises(ValueError):
+        cache.get("../secret")
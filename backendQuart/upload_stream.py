@@ -0,0 +1,140 @@
+import io
+import os
+import re
+import tempfile
+
+PDF_MAGIC = b"%PDF-"
+# Readers accept the PDF header anywhere in the first 1024 bytes
+HEADER_WINDOW = 1024
+# Bytes kept from the start of an upload for the early checks; enough for the
+# header and the linearization dictionary that follows it
+HEAD_SIZE = 4096
+# Page count (/N) in the linearization dictionary of a linearized PDF
+LINEARIZED_PAGES = re.compile(rb"/Linearized\b.{0,1024}?/N\s+(\d+)", re.DOTALL)
+# Leading bytes of the scanned plan formats accepted besides PDF
+IMAGE_MAGIC = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff")
+)
+
+
+class UploadRejected(Exception):
+    """Raised when an upload is not acceptable; status_code is the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def image_type(head):
+    """'jpeg', 'png' or 'tiff' when the first bytes of a file are an image's, else None"""
+    for magic, kind in IMAGE_MAGIC:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def check_upload_head(head, max_pages=None):
+    """
+    Check the first bytes of an upload. Raises UploadRejected when they are
+    neither a PDF's nor a scanned plan image's.
+    """
+    if image_type(head):
+        return
+    if head.find(PDF_MAGIC, 0, HEADER_WINDOW + len(PDF_MAGIC)) < 0:
+        raise UploadRejected("Uploaded file is not a PDF or a JPEG, PNG or TIFF image", 415)
+    match = LINEARIZED_PAGES.search(head)
+    if match and max_pages and int(match.group(1)) > max_pages:
+        raise UploadRejected(f"PDF has {int(match.group(1))} pages, the limit is {max_pages}", 413)
+
+
+class PDFUploadStream:
+    """
+    Destination of one uploaded PDF (or plan image) while the request body
+    is parsed, in place of the form parser's spooled temporary file.
+
+    Data is kept in memory up to `spill_threshold` bytes and then written to
+    a unique temporary file in `directory`, so no more than that of an upload
+    is ever held in memory. The start of the file is checked as soon as it
+    arrives: a part that is neither a PDF nor a plan image, or a linearized
+    PDF declaring more than `max_pages` pages, raises UploadRejected and
+    stops the upload before the rest of the body is read.
+
+    With `defer_rejection` (uploads of a batch, where every file gets its own
+    result) the rejection is kept in `rejection` instead and raised by
+    take(); the rest of the part is read and dropped.
+    """
+
+    def __init__(self, directory, spill_threshold, max_pages=None, defer_rejection=False):
+        self.directory = directory
+        self.spill_threshold = spill_threshold
+        self.max_pages = max_pages
+        self.defer_rejection = defer_rejection
+        self.rejection = None
+        self.file = io.BytesIO()
+        self.path = None
+        self.head = b""
+        self.checked = False
+        self.taken = False
+
+    def write(self, data):
+        if not self.checked:
+            self.head += data[:HEAD_SIZE - len(self.head)]
+            if len(self.head) >= HEAD_SIZE:
+                self.check()
+        if self.rejection is not None:
+            return len(data)
+        if self.path is None and self.file.tell() + len(data) > self.spill_threshold:
+            self.spill()
+        return self.file.write(data)
+
+    def check(self):
+        self.checked = True
+        try:
+            check_upload_head(self.head, self.max_pages)
+        except UploadRejected as e:
+            if not self.defer_rejection:
+                raise
+            self.rejection = e
+            self.discard()
+            self.file = io.BytesIO()
+            self.path = None
+
+    def spill(self):
+        fd, self.path = tempfile.mkstemp(suffix='.pdf', dir=self.directory)
+        spill_file = os.fdopen(fd, 'w+b')
+        spill_file.write(self.file.getbuffer())
+        self.file = spill_file
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # The form parser rewinds the stream once the part is complete, which
+        # is the last chance to check uploads shorter than HEAD_SIZE
+        if not self.checked:
+            self.check()
+        return self.file.seek(offset, whence)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def take(self):
+        """
+        Return (pdf_source, spill_path) like read_upload: the bytes of an
+        upload still in memory, or the path of its temporary file twice. The
+        caller then owns the file and removes it when done. Raises the
+        deferred UploadRejected of a rejected upload.
+        """
+        if self.rejection is not None:
+            raise self.rejection
+        if self.path is None:
+            return self.file.getvalue(), None
+        self.file.close()
+        self.taken = True
+        return self.path, self.path
+
+    def discard(self):
+        """Close the stream and remove its temporary file unless it was taken"""
+        self.file.close()
+        if self.path and not self.taken and os.path.exists(self.path):
+            os.remove(self.path)